@@ -0,0 +1,141 @@
+""" Discovery benchmarks against a simulated loopback network
+
+Runs find_bridges, the via_* methods and parse_description_xml against
+stand-ins on 127.0.0.1 and prints machine readable JSON results, so that
+timings can be compared between releases:
+
+    python -m benchmarks.bench_discovery --bridges 50 --latency 0.01 --loss 0.05
+
+The network is a `discoverhue.testing.FakeNetwork`: each fake device
+answers after its own latency, drawn around `--latency`, and loses SSDP
+replies or answers 503 with probability `--loss`.  The real ssdp.discover
+listens for `--window` seconds, with replies spread over the first half
+of it as devices honouring MX would, and the portal is served by the same fake
+network, only mDNS is replaced by a canned answer.
+
+Reported per benchmark: p50 and p99 wall time, requests issued and CPU
+seconds per bridge found.  CPU is that of the calling thread only, so the
+fake network answering on its own thread is not counted.  via_mdns never
+runs the DNS-SD client and is marked partial; via_scan needs the optional
+httpfind package and a real subnet, so it is reported as skipped.
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from unittest.mock import patch
+
+from discoverhue import discoverhue as dh
+from discoverhue import ssdp
+from discoverhue.mdns import MDNSService
+from discoverhue.testing import FakeNetwork
+
+def mdns_discover(net):
+    """ Stand-in for mdns.discover answering for every bridge of `net` """
+    def discover(service, timeout=1, until=None):
+        services = []
+        for serial in net.serials():
+            service = MDNSService(serial + '._hue._tcp.local.')
+            service.address, service.port = net.urlbase(serial), 443
+            service.properties = {'bridgeid': dh._bridge_id(serial)}
+            services.append(service)
+        return services
+    return discover
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(func, runs):
+    """ Time `func` over `runs` calls, counting description/portal fetches """
+    requests = [0]
+    real_from_url = dh.from_url
+    def counting_from_url(location):
+        requests[0] += 1
+        return real_from_url(location)
+    walls, found = [], 0
+    # discovery runs on this thread, the fake network on another
+    cpu_start = time.thread_time()
+    with patch.object(dh, 'from_url', counting_from_url):
+        for _ in range(runs):
+            start = time.perf_counter()
+            try:
+                result = func()
+            except dh.DiscoveryError:
+                result = {}
+            walls.append(time.perf_counter() - start)
+            found += len(result) if isinstance(result, dict) else int(bool(result))
+    cpu = time.thread_time() - cpu_start
+    return {
+        'runs': runs,
+        'p50': _percentile(walls, 0.50),
+        'p99': _percentile(walls, 0.99),
+        'requests': requests[0] / runs,
+        'found': found / runs,
+        'cpu_per_bridge': cpu / found if found else None,
+    }
+
+def run(bridges=20, noise=10, latency=0.005, loss=0.0, window=0.2, runs=10, seed=0):
+    """ Run every benchmark, returning the results as a dictionary """
+    results = {}
+    with FakeNetwork(bridges, noise, latency=latency, loss=loss,
+                     spread=window / 2, seed=seed) as net:
+        first = net.serials()[0]
+        def ssdp_discover(service, timeout=5, **kw):
+            return ssdp.discover(service, timeout=window, group=net.ssdp_address, **kw)
+        with patch.object(dh, 'ssdp_discover', ssdp_discover), \
+             patch.object(dh, 'mdns_discover', mdns_discover(net)), \
+             patch.object(dh, 'PORTAL_URL', net.portal_url):
+            def parse_one():
+                serial, baseip = dh.parse_description_xml(net.location(first))
+                return {serial: baseip} if serial else {}
+            results['parse_description_xml'] = measure(parse_one, runs)
+            results['via_upnp'] = measure(dh.via_upnp, runs)
+            results['via_nupnp'] = measure(dh.via_nupnp, runs)
+            results['via_mdns'] = measure(dh.via_mdns, runs)
+            results['via_mdns']['partial'] = 'mdns.discover replaced by a canned answer'
+            results['via_scan'] = {'skipped': 'needs httpfind and a real subnet'}
+            results['find_bridges'] = measure(dh.find_bridges, runs)
+            prior = {sn: net.urlbase(sn) for sn in net.serials()}
+            results['find_bridges_prior'] = measure(
+                lambda: dh.find_bridges(dict(prior)), runs)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'scenario': {'bridges': bridges, 'noise': noise,
+                     'latency': latency, 'loss': loss,
+                     'window': window, 'runs': runs, 'seed': seed},
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bridges', type=int, default=20)
+    parser.add_argument('--noise', type=int, default=10,
+                        help='number of non-Hue UPnP devices')
+    parser.add_argument('--latency', type=float, default=0.005,
+                        help='mean seconds added to each description.xml fetch')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='probability a reply is lost or fails with 503')
+    parser.add_argument('--window', type=float, default=0.2,
+                        help='seconds to listen for SSDP replies')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    report = run(args.bridges, args.noise, args.latency, args.loss, args.window,
+                 args.runs, args.seed)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,16 @@
 """ Auto discovery of Hue bridges """
-from .discoverhue import find_bridges
+__all__ = ['Bridge', 'find_bridges', 'find_bridges_many', 'rediscover']
+
+def __getattr__(name):
+    # defer urllib, xml and ssdp imports until discovery is actually used,
+    # keeping `python -m discoverhue` fast when answering from the cache
+    if name == 'discoverhue':
+        import importlib
+        return importlib.import_module('discoverhue.discoverhue')
+    if name in __all__:
+        from . import discoverhue
+        return getattr(discoverhue, name)
+    raise AttributeError("module 'discoverhue' has no attribute {!r}".format(name))
+
+def __dir__():
+    return sorted(set(list(globals()) + __all__ + ['discoverhue']))
@@ -0,0 +1,180 @@
+""" Command line entry point, `python -m discoverhue`
+
+Only argparse, logging and the json cache are imported up front; the
+discovery machinery loads on first use, so `resolve` and `list` answered
+from the cache never pay for urllib, xml or the ssdp module.
+"""
+import argparse
+import logging
+
+def _emit(args, data, text):
+    if args.json:
+        import json
+        print(json.dumps(data, sort_keys=True))
+    elif text:
+        print(text)
+
+def _strategy(args):
+    if not args.adaptive:
+        return None
+    from discoverhue.strategy import Strategy
+    return Strategy()
+
+def _resolve(args):
+    from discoverhue import cache
+    entries = cache.load(args.cache)
+    urlbase = cache.fresh(entries, args.max_age).get(args.serial)
+    if urlbase is None:
+        from discoverhue.discoverhue import find_bridges
+        if args.serial in entries:
+            prior = {args.serial: entries[args.serial]['urlbase']}
+        else:
+            prior = [args.serial]
+        found = find_bridges(prior, mdns=args.mdns, strategy=_strategy(args))
+        if found:
+            cache.update(found, args.cache)
+        urlbase = found.get(args.serial)
+        urlbase = str(urlbase) if urlbase is not None else None
+    _emit(args, {'serial': args.serial, 'urlbase': urlbase}, urlbase)
+    return 0 if urlbase else 1
+
+def _list(args):
+    from discoverhue import cache
+    found = {} if args.refresh else cache.listing(cache.load(args.cache), args.max_age)
+    if not found:
+        from discoverhue.discoverhue import find_bridges
+        found = find_bridges(mdns=args.mdns, strategy=_strategy(args))
+        found = {sn: str(ip) for sn, ip in found.items()}
+        if found:
+            cache.update(found, args.cache, complete=True)
+    _emit(args, found, '\n'.join('{} {}'.format(sn, ip) for sn, ip in sorted(found.items())))
+    return 0 if found else 1
+
+def _target(value):
+    from discoverhue.scan import parse_target
+    try:
+        parse_target(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError('invalid target {!r}: {}'.format(value, error))
+    return value
+
+def _scan(args):
+    import sys
+    from discoverhue import cache
+    from discoverhue.scan import sweep
+    def progress(p):
+        if p.probed == p.total:
+            print('{}: {} probed, {} found'.format(p.target, p.total, p.found),
+                  file=sys.stderr)
+    found = {}
+    for serial, bridge in sweep(args.targets, workers=args.workers,
+                                per_target=args.per_target, progress=progress):
+        found[serial] = str(bridge)
+        _emit(args, {'serial': serial, 'urlbase': str(bridge)},
+              '{} {}'.format(serial, bridge))
+    if found:
+        cache.update(found, args.cache)
+    return 0 if found else 1
+
+def _serve(args):
+    from discoverhue.daemon import Daemon
+    Daemon(path=args.socket, interval=args.interval).serve_forever()
+
+def _agent(args):
+    from discoverhue.fleet import Agent
+    Agent(args.collector, args.segment).run(interval=args.interval)
+
+def _collect(args):
+    from discoverhue.fleet import Collector
+    Collector().serve((args.bind, args.port)).serve_forever()
+
+def _record(args):
+    from discoverhue.capture import Recorder
+    from discoverhue.discoverhue import find_bridges
+    with Recorder(args.file):
+        print(find_bridges())
+
+def _replay(args):
+    import time
+    from discoverhue.capture import Replayer
+    from discoverhue.discoverhue import find_bridges
+    start = time.monotonic()
+    with Replayer(args.file, speed=args.speed):
+        print(find_bridges(precheck_timeout=None))
+    print('Replayed in {:.3f}s'.format(time.monotonic() - start))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='discoverhue',
+                                     description='Auto discovery of Hue bridges')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log discovery progress')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    parser.add_argument('--cache', help='result cache file, see discoverhue.cache')
+    parser.add_argument('--max-age', type=float, default=300,
+                        help='seconds a cached result is trusted (default 300)')
+    parser.add_argument('--mdns', action='store_true',
+                        help='try mDNS before SSDP when discovering')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='order discovery methods by past success here')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    resolve = commands.add_parser('resolve', help='print the URLBase of one bridge')
+    resolve.add_argument('serial', help='bridge serial number, e.g. 0017884e7dad')
+    resolve.set_defaults(func=_resolve)
+
+    listing = commands.add_parser('list', help='print all bridges')
+    listing.add_argument('--refresh', action='store_true',
+                         help='discover even if the cache is fresh')
+    listing.set_defaults(func=_list)
+
+    scan = commands.add_parser('scan', help='sweep routed networks for bridges')
+    scan.add_argument('targets', nargs='+', type=_target,
+                      help='CIDRs or ranges, e.g. 10.1.0.0/16 10.2.0.10-90')
+    scan.add_argument('--workers', type=int, default=256,
+                      help='probes in flight overall (default 256)')
+    scan.add_argument('--per-target', type=int, default=64,
+                      help='probes in flight per target (default 64)')
+    scan.set_defaults(func=_scan)
+
+    serve = commands.add_parser('serve', help='run the shared discovery daemon')
+    serve.add_argument('--socket', help='Unix socket path to listen on')
+    serve.add_argument('--interval', type=float, default=300,
+                       help='seconds between discovery runs (default 300)')
+    serve.set_defaults(func=_serve)
+
+    agent = commands.add_parser('agent', help='push segment changes to a collector')
+    agent.add_argument('collector', help='collector URL, e.g. http://10.0.0.5:8080')
+    agent.add_argument('segment', help='name of this network segment')
+    agent.add_argument('--interval', type=float, default=300,
+                       help='seconds between discovery runs (default 300)')
+    agent.set_defaults(func=_agent)
+
+    collect = commands.add_parser('collect', help='merge agent pushes into one table')
+    collect.add_argument('--bind', default='', help='address to listen on')
+    collect.add_argument('--port', type=int, default=8080,
+                         help='port to listen on (default 8080)')
+    collect.set_defaults(func=_collect)
+
+    record = commands.add_parser('record', help='capture a discovery run to a file')
+    record.add_argument('file', help='capture file to write (JSON lines)')
+    record.set_defaults(func=_record)
+
+    replay = commands.add_parser('replay', help='rerun discovery from a capture')
+    replay.add_argument('file', help='capture file to read')
+    replay.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed factor, 0 for no delays (default 1)')
+    replay.set_defaults(func=_replay)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s.%(msecs)03d %(levelname)s:%(module)s:%(funcName)s: %(message)s',
+        datefmt="%Y-%m-%d %H:%M:%S")
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+
+if __name__ == '__main__':
+    raise SystemExit(main())
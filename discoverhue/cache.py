@@ -0,0 +1,70 @@
+""" Local cache of discovery results
+
+A JSON file of serial:{"urlbase", "last_seen", "listed"} entries, by
+default in $XDG_CACHE_HOME/discoverhue/bridges.json, overridden by the
+environment variable DISCOVERHUE_CACHE.  "listed" is the time of the last
+complete discovery that included the entry, so a listing is only answered
+from the cache when a whole discovery is recent, not when single lookups
+are.  Only the standard json and os modules are imported so that reading
+it stays cheap for the command line.
+"""
+import json
+import os
+import time
+
+def default_path():
+    """ Cache file path from the environment """
+    path = os.environ.get('DISCOVERHUE_CACHE')
+    if path:
+        return path
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'discoverhue', 'bridges.json')
+
+def load(path=None):
+    """ Dictionary of serial:{"urlbase", "last_seen"}, empty if unreadable """
+    try:
+        with open(path or default_path(), encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+def fresh(entries, max_age, now=None):
+    """ Dictionary of serial:urlbase for entries seen within `max_age` seconds """
+    now = time.time() if now is None else now
+    return {sn: e['urlbase'] for sn, e in entries.items()
+            if now - e.get('last_seen', 0) <= max_age}
+
+def listing(entries, max_age, now=None):
+    """ Dictionary of serial:urlbase from the last complete discovery
+
+    Empty unless that discovery ran within `max_age` seconds.
+    """
+    now = time.time() if now is None else now
+    listed = max((e.get('listed', 0) for e in entries.values()), default=0)
+    if not listed or now - listed > max_age:
+        return {}
+    return {sn: e['urlbase'] for sn, e in entries.items()
+            if e.get('listed') == listed}
+
+def update(found, path=None, now=None, complete=False):
+    """ Merge a serial:URLBase dictionary into the cache file
+
+    `complete` -- `found` is the result of a full discovery, see `listing`
+    """
+    path = path or default_path()
+    now = time.time() if now is None else now
+    entries = load(path)
+    for serial, urlbase in found.items():
+        entry = {'urlbase': str(urlbase), 'last_seen': now}
+        listed = now if complete else entries.get(serial, {}).get('listed')
+        if listed:
+            entry['listed'] = listed
+        entries[serial] = entry
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=1, sort_keys=True)
+    os.replace(temp, path)
+    return entries
@@ -0,0 +1,165 @@
+""" Record and replay of discovery traffic
+
+`Recorder` captures every raw SSDP reply and every HTTP body fetched
+during discovery (portal JSON and description.xml) with its arrival time,
+and `Replayer` feeds a capture back with the original timing, so a slow
+discovery seen in the field can be reproduced and benchmarked offline:
+
+    with Recorder('site.jsonl'):
+        find_bridges()
+
+    with Replayer('site.jsonl'):
+        find_bridges()          # same answers, same delays, no network
+
+Captures are JSON lines, one event per line, never pickles:
+    {"t": 0.0, "kind": "ssdp_search", "service": "ssdp:all", "timeout": 5}
+    {"t": 0.21, "kind": "ssdp_reply", "data": "HTTP/1.1 200 OK\\r\\n..."}
+    {"t": 5.0, "kind": "ssdp_end"}
+    {"t": 5.0, "kind": "http", "url": "...", "duration": 0.04, "body": "..."}
+    {"t": 9.1, "kind": "http", "url": "...", "duration": 3.0,
+     "error": "URLError", "reason": "timed out"}
+
+`t` is seconds since recording started.  Both work by swapping the
+`from_url` and `ssdp_discover` hooks of discoverhue.discoverhue for the
+duration of the with-block, so neither is safe to use from two threads.
+"""
+import json
+import time
+import urllib.request
+from collections import defaultdict, deque
+from discoverhue import discoverhue as _dh
+from discoverhue import ssdp
+import logging
+logger = logging.getLogger('discoverhue')
+
+class _Hooks(object):
+    """ Swap discoverhue's network hooks while active """
+    def _install(self, from_url, ssdp_discover):
+        self._saved = (_dh.from_url, _dh.ssdp_discover)
+        _dh.from_url, _dh.ssdp_discover = from_url, ssdp_discover
+
+    def _uninstall(self):
+        _dh.from_url, _dh.ssdp_discover = self._saved
+
+class Recorder(_Hooks):
+    """ Capture discovery traffic to `path` while used as a context """
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._start = None
+
+    def _write(self, kind, **event):
+        event.update(t=round(time.monotonic() - self._start, 6), kind=kind)
+        self._file.write(json.dumps(event, sort_keys=True) + '\n')
+
+    def _from_url(self, location):
+        start = time.monotonic()
+        try:
+            body = self._real_from_url(location)
+        except urllib.request.HTTPError as error:
+            self._write('http', url=location, duration=time.monotonic() - start,
+                        error='HTTPError', code=error.code, reason=str(error.reason))
+            raise
+        except urllib.request.URLError as error:
+            self._write('http', url=location, duration=time.monotonic() - start,
+                        error='URLError', reason=str(error.reason))
+            raise
+        self._write('http', url=location, duration=time.monotonic() - start,
+                    body=body)
+        return body
+
+    def _ssdp_discover(self, service, timeout=5, callback=None, **kw):
+        self._write('ssdp_search', service=service, timeout=timeout)
+        def reply(data):
+            self._write('ssdp_reply', data=data.decode('latin-1'))
+            if callback is not None:
+                callback(data)
+        try:
+            return self._real_ssdp_discover(service, timeout=timeout,
+                                            callback=reply, **kw)
+        finally:
+            self._write('ssdp_end')
+
+    def __enter__(self):
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._start = time.monotonic()
+        self._real_from_url = _dh.from_url
+        self._real_ssdp_discover = _dh.ssdp_discover
+        self._install(self._from_url, self._ssdp_discover)
+        logger.info('Recording discovery to %s', self.path)
+        return self
+
+    def __exit__(self, *exc):
+        self._uninstall()
+        self._file.close()
+
+def load(path):
+    """ List of events from a capture file """
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class Replayer(_Hooks):
+    """ Answer discovery from a capture while used as a context
+
+    `speed` -- 1.0 replays the recorded delays as they happened, 2.0 twice
+    as fast, 0 without any delay.  Requests for a url are answered from its
+    recorded fetches in order, the last one repeating once exhausted; urls
+    never recorded raise URLError like an unreachable host.
+    """
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self._http = defaultdict(deque)
+        self._searches = deque()
+        search = None
+        for event in load(path):
+            kind = event['kind']
+            if kind == 'http':
+                self._http[event['url']].append(event)
+            elif kind == 'ssdp_search':
+                search = {'start': event['t'], 'replies': [], 'end': event['t']}
+                self._searches.append(search)
+            elif kind == 'ssdp_reply' and search is not None:
+                search['replies'].append((event['t'] - search['start'],
+                                          event['data'].encode('latin-1')))
+            elif kind == 'ssdp_end' and search is not None:
+                search['end'] = event['t']
+
+    def _sleep(self, seconds):
+        if self.speed and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def _from_url(self, location):
+        fetches = self._http.get(location)
+        if not fetches:
+            raise urllib.request.URLError('not in capture')
+        event = fetches.popleft() if len(fetches) > 1 else fetches[0]
+        self._sleep(event['duration'])
+        if event.get('error') == 'HTTPError':
+            raise urllib.request.HTTPError(location, event['code'],
+                                           event['reason'], None, None)
+        if event.get('error'):
+            raise urllib.request.URLError(event['reason'])
+        return event['body']
+
+    def _ssdp_discover(self, service, timeout=5, callback=None, **kw):
+        if not self._searches:
+            self._sleep(timeout)
+            return []
+        search = self._searches.popleft() if len(self._searches) > 1 else self._searches[0]
+        responses, elapsed = {}, 0.0
+        for offset, data in search['replies']:
+            self._sleep(offset - elapsed)
+            elapsed = offset
+            if callback is not None:
+                callback(data)
+            response = ssdp.SSDPResponse(data)
+            responses[response.location] = response
+        self._sleep(search['end'] - search['start'] - elapsed)
+        return list(responses.values())
+
+    def __enter__(self):
+        self._install(self._from_url, self._ssdp_discover)
+        return self
+
+    def __exit__(self, *exc):
+        self._uninstall()
@@ -0,0 +1,201 @@
+""" Discovery daemon shared by the processes on a host
+
+A single daemon owns discovery and refreshes it periodically, answering
+lookups over a Unix domain socket.  Any number of local workers then cost
+one multicast search instead of one each.
+
+Protocol is one request line per connection, answered with one JSON line:
+    ALL              -> object of serial:URLBase pairs for every bridge
+    GET <serial>     -> URLBase string for that serial, or null
+Until the first discovery run completes both are answered with
+    {"error": "not ready"}
+
+Use `lookup` from client code, it falls back to in-process discovery
+when no daemon is listening.
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import logging
+logger = logging.getLogger('discoverhue')
+
+REFRESH_INTERVAL = 300
+
+class NotReady(OSError):
+    """ Daemon is listening but has not completed a discovery yet """
+
+def _private_dir():
+    """ Per-user directory for the socket when there is no runtime directory """
+    return os.path.join(tempfile.gettempdir(), 'discoverhue-{}'.format(os.getuid()))
+
+def default_path():
+    """ Per-user socket path, preferring the XDG runtime directory """
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return os.path.join(runtime, 'discoverhue-{}.sock'.format(os.getuid()))
+    return os.path.join(_private_dir(), 'daemon.sock')
+
+def _check_owner(path, private=False):
+    """ Raise PermissionError unless this user owns `path`
+
+    With `private` it must also be a directory closed to everyone else.
+    """
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or (private and (not stat.S_ISDIR(st.st_mode)
+                                                 or st.st_mode & 0o077)):
+        raise PermissionError('{} is not private to this user'.format(path))
+
+class _Handler(socketserver.StreamRequestHandler):
+    """ Answer a single request line from the daemon's table """
+    def handle(self):
+        line = self.rfile.readline(256).decode('utf-8', 'replace').split()
+        if line[:1] in (['ALL'], ['GET']) and not self.server.daemon.ready:
+            reply = {'error': 'not ready'}
+        elif line[:1] == ['ALL']:
+            reply = self.server.daemon.bridges()
+        elif line[:1] == ['GET'] and len(line) == 2:
+            reply = self.server.daemon.bridges().get(line[1])
+        else:
+            reply = {'error': 'bad request'}
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+class Daemon(object):
+    """ Periodic discovery with results served over a Unix socket
+
+    `path` -- socket path, defaults to `default_path()`
+    `interval` -- seconds between discovery runs
+    `discover` -- callable returning a dict of serial:URLBase pairs,
+    defaults to `find_bridges` and is mainly replaced for testing
+    """
+    def __init__(self, path=None, interval=REFRESH_INTERVAL, discover=None):
+        self.path = path or default_path()
+        self.interval = interval
+        self._discover = discover
+        self._bridges = {}
+        self.ready = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+
+    def bridges(self):
+        """ Snapshot of the current serial:URLBase table """
+        with self._lock:
+            return dict(self._bridges)
+
+    def refresh(self):
+        """ Run discovery once, keeping the prior table if nothing is found """
+        if self._discover is None:
+            from discoverhue.discoverhue import find_bridges
+            self._discover = find_bridges
+        found = self._discover()
+        with self._lock:
+            if found:
+                self._bridges = {sn: str(ip) for sn, ip in found.items()}
+            # only once the table is in place, so no request sees it empty
+            self.ready = True
+        if found:
+            logger.info('Daemon refreshed %d bridge(s)', len(found))
+        else:
+            logger.warning('Daemon refresh found nothing, keeping prior table')
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:   # keep serving stale results over dying
+                logger.exception('Daemon refresh failed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """ Bind the socket and begin refreshing in a background thread """
+        directory = os.path.dirname(self.path)
+        if directory == _private_dir():
+            # in the shared temporary directory, anyone could have made it
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            _check_owner(directory, private=True)
+        if os.path.exists(self.path):
+            # a live daemon would answer, anything else is a stale socket
+            try:
+                query(path=self.path)
+            except NotReady:
+                raise OSError('Daemon already listening at ' + self.path)
+            except (OSError, ValueError):
+                _check_owner(self.path)
+                os.unlink(self.path)
+            else:
+                raise OSError('Daemon already listening at ' + self.path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.path, _Handler)
+        self._server.daemon = self
+        self._server.daemon_threads = True
+        threading.Thread(target=self._refresh_loop, daemon=True).start()
+        logger.info('Daemon listening at %s', self.path)
+
+    def serve_forever(self):
+        """ Start if needed and serve until `stop` or interrupted """
+        if self._server is None:
+            self.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def stop(self):
+        """ Ask `serve_forever` to return """
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self):
+        """ Release the socket and remove its path """
+        self._stop.set()
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+def query(serial=None, path=None, timeout=1.0):
+    """ Ask a running daemon for one serial or the whole table
+
+    Raises OSError (typically FileNotFoundError or ConnectionRefusedError)
+    when no daemon is listening at `path`, PermissionError when the default
+    socket directory is not private to this user, `NotReady` while the
+    daemon has not finished its first discovery, and ValueError for a reply
+    that is not JSON.
+    """
+    path = path or default_path()
+    if os.path.dirname(path) == _private_dir():
+        _check_owner(os.path.dirname(path), private=True)
+    request = 'GET {}\n'.format(serial) if serial else 'ALL\n'
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(request.encode())
+        with sock.makefile('rb') as reply:
+            answer = json.loads(reply.readline().decode())
+    if isinstance(answer, dict) and answer.get('error') == 'not ready':
+        raise NotReady('Daemon at {} is not ready'.format(path))
+    return answer
+
+def lookup(serial=None, path=None, timeout=1.0):
+    """ Query the daemon, or run discovery in-process if it is absent
+
+    `serial` -- optional serial number
+    * omitted - returns dictionary of all serial:URLBase pairs
+    * string - returns URLBase as string or None
+    """
+    try:
+        return query(serial, path, timeout)
+    except (OSError, ValueError) as error:   # absent, or not a daemon answering
+        logger.info('No discovery daemon (%s), running locally', error)
+    from discoverhue.discoverhue import find_bridges
+    found = find_bridges(serial)
+    if serial:
+        return str(found) if found else None
+    return {sn: str(ip) for sn, ip in found.items()}
@@ -1,6 +1,6 @@
 """ Auto discovery of Hue bridges
 
-Implements UPnP, N-PnP, and IP Scan methods.
+Implements mDNS, UPnP, N-PnP, and IP Scan methods.
 TODO: consider allowing a single IP as parameter for validation
 
 Reference:
@@ -32,11 +32,22 @@ import urllib.request
 from urllib.parse import urlsplit, urlunsplit
 import xml.etree.ElementTree as ET
 import json
+import time
+from collections import namedtuple
 import logging
 logger = logging.getLogger('discoverhue')
 
 if __name__ is not '__main__':
     from discoverhue.ssdp import discover as ssdp_discover
+    from discoverhue.mdns import discover as mdns_discover
+    from discoverhue import stats as stats_module
+    from discoverhue.stats import phase as stats_phase, count as stats_count
+
+PRECHECK_TIMEOUT = 0.5
+PRECHECK_BATCH = 256
+PORTAL_URL = 'https://www.meethue.com/api/nupnp'
+# optional discoverhue.portal.PortalClient, caching and rate limit aware
+portal_client = None
 
 class DiscoveryError(Exception):
     """ Raised when a discovery method yields no results """
@@ -56,6 +67,123 @@ def from_url(location):
         the_page = response.read().decode()
         return the_page
 
+def _precheck(xmlurls, timeout=PRECHECK_TIMEOUT):
+    """ Concurrent non-blocking TCP connect to the host of each url
+
+    Returns the set of urls whose host accepted a connection on the url's
+    port within `timeout` seconds, so dead addresses are rejected without
+    waiting on urllib.  A timeout of None skips the check entirely.
+    Urls are checked `PRECHECK_BATCH` at a time to stay well within the
+    open file limit.
+    """
+    xmlurls = set(xmlurls)
+    if timeout is None:
+        return xmlurls
+    reachable = set()
+    started = time.monotonic()
+    ordered = sorted(xmlurls)
+    for start in range(0, len(ordered), PRECHECK_BATCH):
+        reachable |= _precheck_batch(ordered[start:start+PRECHECK_BATCH], timeout)
+    stats = stats_module.current()
+    if stats is not None:
+        stats.add_time('precheck', time.monotonic() - started)
+        stats.count('precheck_rejected', len(xmlurls) - len(reachable))
+    logger.debug('Precheck: %d of %d reachable', len(reachable), len(xmlurls))
+    return reachable
+
+def _precheck_batch(xmlurls, timeout):
+    """ Set of `xmlurls` accepting a connection, all checked at once """
+    import errno
+    import selectors
+    import socket
+    reachable = set()
+    selector = selectors.DefaultSelector()
+    try:
+        for xmlurl in xmlurls:
+            spl = urlsplit(xmlurl)
+            try:
+                port = spl.port or (443 if spl.scheme == 'https' else 80)
+                family, _, _, _, address = socket.getaddrinfo(
+                    spl.hostname, port, type=socket.SOCK_STREAM)[0]
+            except (ValueError, OSError):
+                continue
+            try:
+                sock = socket.socket(family, socket.SOCK_STREAM)
+            except OSError as error:
+                # out of descriptors and the like, counts as unreachable
+                logger.debug('Precheck of %s failed: %s', xmlurl, error)
+                continue
+            try:
+                sock.setblocking(False)
+                result = sock.connect_ex(address)
+            except OSError:
+                result = None
+            if result in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                selector.register(sock, selectors.EVENT_WRITE, xmlurl)
+            else:
+                sock.close()
+        deadline = time.monotonic() + timeout
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                sock = key.fileobj
+                if not sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                    reachable.add(key.data)
+                selector.unregister(sock)
+                sock.close()
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+    return reachable
+
+class Bridge(str):
+    """ Bridge record as found in description.xml
+
+    serial    - serial number, e.g. 0017884e7dad
+    host      - hostname (ip) portion of urlbase
+    port      - port of urlbase, the scheme default if not given
+    urlbase   - URLBase as found in description.xml, e.g. http://192.168.0.1:80/
+    source    - discovery method that found it: mdns, upnp, nupnp or scan
+    last_seen - time.time() of the description.xml read
+    model     - modelName from description.xml
+
+    A str of its URLBase, so existing code treating found bridges as
+    strings, and passing them back into `find_bridges`, keeps working.
+    """
+    __slots__ = ('serial', 'host', 'port', 'source', 'last_seen', 'model')
+
+    def __new__(cls, urlbase, serial=None, source=None, last_seen=None, model=None):
+        self = str.__new__(cls, urlbase)
+        spl = urlsplit(urlbase)
+        self.serial = serial
+        self.host = spl.hostname
+        self.port = spl.port or (443 if spl.scheme == 'https' else 80)
+        self.source = source
+        self.last_seen = last_seen
+        self.model = model
+        return self
+
+    def __getnewargs__(self):
+        return (str(self),)
+
+    @property
+    def urlbase(self):
+        """ URLBase as a plain string """
+        return str.__str__(self)
+
+    @property
+    def hostname(self):
+        """ Convenient access to hostname (ip) portion of the URL """
+        return self.host
+
+    def _asdict(self):
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields['urlbase'] = self.urlbase
+        return fields
+
 def parse_description_xml(location):
     """ Extract serial number, base ip, and img url from description.xml
 
@@ -63,23 +191,23 @@ def parse_description_xml(location):
     malformed XML returns ParseError
 
     Refer to included example for URLBase and serialNumber elements
+    Returns the serial and a `Bridge` for Hue bridges, (None, None) for
+    other devices, and (None, error) for unreachable locations
     """
-    class _URLBase(str):
-        """ Convenient access to hostname (ip) portion of the URL """
-        @property
-        def hostname(self):
-            return urlsplit(self).hostname
-
     # """TODO: review error handling on xml"""
     # may want to suppress ParseError in the event that it was caused
     # by a none bridge device although this seems unlikely
+    stats_count('description_requests')
     try:
-        xml_str = from_url(location)
+        with stats_phase('description'):
+            xml_str = from_url(location)
     except urllib.request.HTTPError as error:
         logger.info("No description for %s: %s", location, error)
         return None, error
     except urllib.request.URLError as error:
         logger.info("No HTTP server for %s: %s", location, error)
+        if 'timed out' in str(error.reason):
+            stats_count('timeouts')
         return None, error
     else:
         root = ET.fromstring(xml_str)
@@ -87,12 +215,14 @@ def parse_description_xml(location):
         baseip = root.find('root:URLBase', rootname).text
         device = root.find('root:device', rootname)
         serial = device.find('root:serialNumber', rootname).text
+        model = device.find('root:modelName', rootname)
         # anicon = device.find('root:iconList', rootname).find('root:icon', rootname)
         # imgurl = anicon.find('root:url', rootname).text
 
         # Alternatively, could look directly in the modelDescription field
         if all(x in xml_str.lower() for x in ['philips', 'hue']):
-            return serial, _URLBase(baseip)
+            return serial, Bridge(baseip, serial, last_seen=time.time(),
+                                  model=model.text if model is not None else None)
         else:
             return None, None
 
@@ -119,14 +249,26 @@ def _build_from(baseip):
     # baseip = baseip if baseip[-4:].lower() == '.xml' else baseip+'/description.xml'
     # return baseip
 
-def parse_portal_json():
+def _same_base(first, second):
+    """ Whether two ips or URLBases point at the same description.xml """
+    def key(baseip):
+        spl = urlsplit(_build_from(str(baseip)))
+        return (spl.scheme, spl.hostname,
+                spl.port or (443 if spl.scheme == 'https' else 80), spl.path)
+    return key(first) == key(second)
+
+def parse_portal_json(client=None):
     """ Extract id, ip from https://www.meethue.com/api/nupnp
 
     Note: the ip is only the base and needs xml file appended, and
     the id is not exactly the same as the serial number in the xml
+
+    `client` -- optional `discoverhue.portal.PortalClient` caching the
+    portal answer, defaults to the module's `portal_client`
     """
+    client = client or portal_client
     try:
-        json_str = from_url('https://www.meethue.com/api/nupnp')
+        json_str = from_url(PORTAL_URL) if client is None else client.fetch()
     except urllib.request.HTTPError as error:
         logger.error("Problem at portal: %s", error)
         raise
@@ -145,24 +287,60 @@ def parse_portal_json():
             portal_list.append((serial, xmlurl))
         return portal_list
 
+def _confirm(locations, source):
+    """ Read description.xml at each location, returning serial:Bridge """
+    found_bridges = {}
+    for location in locations:
+        serial, bridge_info = parse_description_xml(location)
+        if serial:
+            if isinstance(bridge_info, Bridge):
+                bridge_info.source = source
+            found_bridges[serial] = bridge_info
+    logger.debug('%s', found_bridges)
+    return found_bridges
+
+def _bridge_id(serial):
+    """ mDNS and portal bridge id from a serial, 0017884e7dad -> 001788fffe4e7dad """
+    serial = serial.lower()
+    return serial if len(serial) == 16 else serial[0:6] + 'fffe' + serial[6:]
+
+def via_mdns(wanted=None, timeout=1):
+    """ Use DNS-SD over mDNS as advertised by current bridges
+
+    `wanted` -- optional serial numbers, stop listening once all are seen
+    """
+    wanted_ids = {_bridge_id(serial) for serial in wanted or ()}
+    def seen_all(services):
+        seen_ids = {s.properties.get('bridgeid', '').lower() for s in services}
+        return wanted_ids <= seen_ids
+    with stats_phase('mdns'):
+        services = mdns_discover('_hue._tcp.local', timeout=timeout,
+                                 until=seen_all if wanted_ids else None)
+    logger.info('mDNS returned %d Hue bridge(s).', len(services))
+    # Confirm mDNS gave an accessible bridge device by reading from the
+    # advertised address.  The service port is the https API, not HTTP
+    found_bridges = _confirm((_build_from(s.address) for s in services), 'mdns')
+    if found_bridges:
+        return found_bridges
+    else:
+        raise DiscoveryError('mDNS returned nothing')
+
 def via_upnp():
     """ Use SSDP as described by the Philips guide """
-    ssdp_list = ssdp_discover("ssdp:all", timeout=5)
-    #import pickle
-    #with open("ssdp.pickle", "wb") as f:
-        #pickle.dump(ssdp_list,f)
+    packets = [0]
+    def received(data):
+        packets[0] += 1
+    with stats_phase('ssdp'):
+        ssdp_list = ssdp_discover("ssdp:all", timeout=5, callback=received)
     bridges_from_ssdp = [u for u in ssdp_list if 'IpBridge' in u.server]
+    # every datagram, ssdp_list holds only one reply per location
+    stats_count('ssdp_packets', packets[0])
+    stats_count('ssdp_filtered', len(ssdp_list) - len(bridges_from_ssdp))
     logger.info('SSDP returned %d items with %d Hue bridges(s).',
                  len(ssdp_list), len(bridges_from_ssdp))
     # Confirm SSDP gave an accessible bridge device by reading from the returned
     # location.  Should look like: http://192.168.0.1:80/description.xml
-    found_bridges = {}
-    for bridge in bridges_from_ssdp:
-        serial, bridge_info = parse_description_xml(bridge.location)
-        if serial:
-            found_bridges[serial] = bridge_info
-
-    logger.debug('%s', found_bridges)
+    found_bridges = _confirm((u.location for u in bridges_from_ssdp), 'upnp')
     if found_bridges:
         return found_bridges
     else:
@@ -170,55 +348,141 @@ def via_upnp():
 
 def via_nupnp():
     """ Use method 2 as described by the Philips guide """
-    bridges_from_portal = parse_portal_json()
+    with stats_phase('portal'):
+        bridges_from_portal = parse_portal_json()
     logger.info('Portal returned %d Hue bridges(s).',
                  len(bridges_from_portal))
     # Confirm Portal gave an accessible bridge device by reading from the returned
     # location.  Should look like: http://192.168.0.1/description.xml
-    found_bridges = {}
-    for bridge in bridges_from_portal:
-        serial, bridge_info = parse_description_xml(bridge[1])
-        if serial:
-            found_bridges[serial] = bridge_info
-
-    logger.debug('%s', found_bridges)
+    found_bridges = _confirm((b[1] for b in bridges_from_portal), 'nupnp')
     if found_bridges:
         return found_bridges
     else:
         raise DiscoveryError('Portal returned nothing')
 
-def via_scan():
-    """ IP scan - now implemented """
+def _local_networks():
+    """ /24 networks of this host's addresses """
     import socket
     import ipaddress
+    hosts = socket.gethostbyname_ex(socket.gethostname())[2]
+    # TODO: how do we determine subnet configuration?
+    return [(host, ipaddress.ip_interface(host+'/24').network) for host in hosts]
+
+def via_scan(wanted=None, seen=(), networks=None):
+    """ IP scan - now implemented
+
+    `wanted` -- serials being looked for; probes the likeliest hosts first
+    (`seen` addresses, neighbor table, DHCP ranges) and stops once all of
+    them are confirmed.  Without it the whole subnet is surveyed.
+    `networks` -- CIDRs or ranges to sweep concurrently instead of the /24
+    of each local address, see `discoverhue.scan.sweep`
+    """
+    if wanted or networks:
+        from discoverhue import scan
+        found_bridges = {}
+        neighbor_hosts = scan.neighbors()
+        remaining = set(wanted or ())
+        if networks:
+            with stats_phase('scan'):
+                for serial, bridge_info in scan.sweep(networks, wanted, seen=seen,
+                                                      neighbor_hosts=neighbor_hosts):
+                    found_bridges[serial] = bridge_info
+            logger.info('Scan on %s', ', '.join(str(n) for n in networks))
+        else:
+            for host, network in _local_networks():
+                with stats_phase('scan'):
+                    hosts = scan.prioritize(network, seen, neighbor_hosts)
+                    for serial, bridge_info in scan.probe(hosts, remaining):
+                        found_bridges[serial] = bridge_info
+                        remaining.discard(serial)
+                logger.info('Scan on %s', host)
+                if not remaining:
+                    break
+        logger.info('Scan found %d Hue bridges(s).', len(found_bridges))
+        if found_bridges:
+            return found_bridges
+        raise DiscoveryError('Scan returned nothing')
+
     import httpfind
     bridges_from_scan = []
-    hosts = socket.gethostbyname_ex(socket.gethostname())[2]
-    for host in hosts:
-        bridges_from_scan += httpfind.survey(
-            # TODO: how do we determine subnet configuration?
-            ipaddress.ip_interface(host+'/24').network,
-            path='description.xml',
-            pattern='(P|p)hilips')
+    for host, network in _local_networks():
+        with stats_phase('scan'):
+            bridges_from_scan += httpfind.survey(
+                network,
+                path='description.xml',
+                pattern='(P|p)hilips')
         logger.info('Scan on %s', host)
     logger.info('Scan returned %d Hue bridges(s).', len(bridges_from_scan))
     # Confirm Scan gave an accessible bridge device by reading from the returned
     # location.  Should look like: http://192.168.0.1/description.xml
-    found_bridges = {}
-    for bridge in bridges_from_scan:
-        serial, bridge_info = parse_description_xml(bridge)
-        if serial:
-            found_bridges[serial] = bridge_info
-
-    logger.debug('%s', found_bridges)
+    found_bridges = _confirm(bridges_from_scan, 'scan')
     if found_bridges:
         return found_bridges
     else:
         raise DiscoveryError('Scan returned nothing')
 
-    # TODO: consolidate common code in the 3 via_* routines
+def _discover(mdns=False, wanted=None, strategy=None, seen=()):
+    """ Run each discovery method in turn until one finds something
+
+    `mdns` -- try `via_mdns` ahead of SSDP, ending early on `wanted` serials
+    `seen` -- addresses the `wanted` bridges had before, scanned first
+    `strategy` -- optional `discoverhue.strategy.Strategy` choosing the
+    order and learning from the outcome, otherwise the order is fixed
+    """
+    methods = {'upnp': via_upnp, 'nupnp': via_nupnp,
+               'scan': lambda: via_scan(wanted, seen)}
+    names = ['upnp', 'nupnp', 'scan']
+    if mdns:
+        methods['mdns'] = lambda: via_mdns(wanted)
+        names.insert(0, 'mdns')
+    # mDNS answers lacking a wanted serial are kept and merged with the
+    # next method's, bridges not advertising _hue._tcp are only found there
+    partial = {}
+    def complete(name, found):
+        return not (name == 'mdns' and wanted and not set(wanted) <= set(found))
+    def merged(found):
+        result = dict(found)
+        result.update(partial)
+        return result
+
+    if strategy is None:
+        for name in names:
+            try:
+                found = methods[name]()
+            except DiscoveryError:
+                continue
+            if complete(name, found):
+                return merged(found)
+            partial = found
+        if not partial:
+            logger.warning("All discovery methods returned nothing")
+        return partial
+
+    try:
+        for name in strategy.order(names):
+            start = time.monotonic()
+            try:
+                found = methods[name]()
+            except DiscoveryError:
+                found = {}
+            except Exception:
+                strategy.record(name, False, time.monotonic() - start)
+                raise
+            strategy.record(name, bool(found), time.monotonic() - start)
+            if found and complete(name, found):
+                return merged(found)
+            partial = found or partial
+        if not partial:
+            logger.warning("All discovery methods returned nothing")
+        return partial
+    finally:
+        try:
+            strategy.save()
+        except OSError as error:
+            logger.warning('Could not save discovery strategy: %s', error)
 
-def find_bridges(prior_bridges=None):
+def find_bridges(prior_bridges=None, precheck_timeout=PRECHECK_TIMEOUT, mdns=False,
+                 stats=None, strategy=None, networks=None):
     """ Confirm or locate IP addresses of Philips Hue bridges.
 
     `prior_bridges` -- optional list of bridge serial numbers
@@ -227,7 +491,31 @@ def find_bridges(prior_bridges=None):
     * dictionary - validate provided ip's before attempting discovery
     * collection or sequence - return dictionary of filtered sn:ip pairs
       * if mutable then found bridges are removed from argument
+    `precheck_timeout` -- seconds allowed for the TCP connect check made on
+    all provided ip's before fetching description.xml, None to disable
+    `mdns` -- try mDNS before SSDP, typically answered in well under a second
+    `stats` -- optional `discoverhue.stats.Stats` receiving per-phase timings
+    and counters, created automatically when `discoverhue.stats.sink` is set
+    `strategy` -- optional `discoverhue.strategy.Strategy` ordering the
+    discovery methods by their past success and latency on this network
+    `networks` -- CIDRs or address ranges, e.g. '10.1.0.0/16', swept after
+    the usual discovery with the results merged, reaching routed subnets;
+    with serials given only while some are still missing
     """
+    sink = stats_module.sink
+    if stats is None and sink is None:
+        return _find_bridges(prior_bridges, precheck_timeout, mdns, strategy,
+                             networks)
+    stats = stats_module.Stats() if stats is None else stats
+    with stats, stats_phase('find_bridges'):
+        found_bridges = _find_bridges(prior_bridges, precheck_timeout, mdns,
+                                      strategy, networks)
+    if sink is not None:
+        sink(stats)
+    return found_bridges
+
+def _find_bridges(prior_bridges, precheck_timeout, mdns, strategy, networks):
+    """ find_bridges without the stats handling """
     found_bridges = {}
 
     # Validate caller's provided list
@@ -238,31 +526,48 @@ def find_bridges(prior_bridges=None):
         # in either case, the discovery must be executed
         run_discovery = True
     else:
+        prior_urls = {prior_sn: _build_from(prior_ip)
+                      for prior_sn, prior_ip in prior_bridges_list if prior_ip}
+        reachable = _precheck(prior_urls.values(), precheck_timeout)
         for prior_sn, prior_ip in prior_bridges_list:
             if prior_ip:
-                serial, baseip = parse_description_xml(_build_from(prior_ip))
+                if prior_urls[prior_sn] in reachable:
+                    serial, baseip = parse_description_xml(prior_urls[prior_sn])
+                else:
+                    serial = None
                 if serial:
                     # there is a bridge at provided IP, add to found
                     found_bridges[serial] = baseip
+                    stats_count('cache_hits')
                 else:
                     # nothing usable at that ip
                     logger.info('%s not found at %s', prior_sn, prior_ip)
+                    stats_count('cache_misses')
         run_discovery = found_bridges.keys() != prior_bridges.keys()
 
     # prior_bridges is None, unknown, dict of unfound SNs, or empty dict
     # found_bridges is dict of found SNs from prior, or empty dict
     if run_discovery:
         # do the discovery, not all IPs were confirmed
-        try:
-            found_bridges.update(via_upnp())
-        except DiscoveryError:
-            try:
-                found_bridges.update(via_nupnp())
-            except DiscoveryError:
+        seen = ()
+        if not prior_bridges:
+            wanted = None
+        elif isinstance(prior_bridges, str):
+            wanted = [prior_bridges]
+        else:
+            wanted = [sn for sn in prior_bridges if sn not in found_bridges]
+            if isinstance(prior_bridges, dict):
+                seen = [prior_bridges[sn] for sn in wanted if prior_bridges[sn]]
+        found_bridges.update(_discover(mdns, wanted, strategy, seen))
+        if networks:
+            # routed subnets are beyond SSDP, so sweep them in any case
+            if wanted is not None:
+                wanted = [sn for sn in wanted if sn not in found_bridges]
+            if wanted is None or wanted:
                 try:
-                    found_bridges.update(via_scan())
+                    found_bridges.update(via_scan(wanted, seen, networks))
                 except DiscoveryError:
-                    logger.warning("All discovery methods returned nothing")
+                    logger.info('Nothing more found on %s', networks)
 
     if prior_bridges:
         # prior_bridges is either single SN or dict of unfound SNs
@@ -313,8 +618,158 @@ def find_bridges(prior_bridges=None):
 
     return found_bridges
 
+BulkResult = namedtuple('BulkResult', ['found', 'missing', 'stale'])
+BulkResult.__doc__ = """ Partitioned result of `find_bridges_many`
+
+    found   - dict of serial:URLBase confirmed at the prior ip or discovered
+    missing - set of serials not located anywhere
+    stale   - dict of serial:URLBase for bridges whose prior ip failed
+              but which discovery located elsewhere
+"""
+
+def find_bridges_many(serials, precheck_timeout=PRECHECK_TIMEOUT):
+    """ Locate many bridges with a single discovery pass.
+
+    `serials` -- iterable of serial numbers, or dictionary of serial:ip
+    pairs whose ips are validated first, each distinct ip fetched once.
+    Discovery runs at most once, and only if some serial is unconfirmed.
+    `precheck_timeout` applies as in `find_bridges`.
+    The argument is never modified.
+
+    Returns a `BulkResult` of found, missing, and stale partitions.
+    """
+    try:
+        prior = dict(serials.items())
+    except AttributeError:
+        prior = dict.fromkeys(serials)
+
+    # Verify each distinct prior location once, indexing what answered
+    answers = {}
+    prior_urls = {sn: _build_from(ip) for sn, ip in prior.items() if ip}
+    for xmlurl in _precheck(set(prior_urls.values()), precheck_timeout):
+        serial, baseip = parse_description_xml(xmlurl)
+        if serial:
+            answers[xmlurl] = (serial, baseip)
+    verified = {serial: (xmlurl, baseip) for xmlurl, (serial, baseip) in answers.items()}
+
+    found, stale = {}, {}
+    for serial, ip in prior.items():
+        xmlurl, baseip = verified.get(serial, (None, None))
+        if xmlurl is not None and (not ip or xmlurl == prior_urls[serial]):
+            found[serial] = baseip
+            stats_count('cache_hits')
+        elif ip:
+            logger.info('%s not found at %s', serial, ip)
+            # answering at another serial's prior ip means it has moved
+            stale[serial] = baseip
+            stats_count('cache_misses')
+
+    if len(found) + sum(ip is not None for ip in stale.values()) < len(prior):
+        discovered = _discover()
+        for serial in prior.keys() - found.keys():
+            if stale.get(serial) is not None:
+                continue
+            if serial in discovered:
+                if serial in stale:
+                    stale[serial] = discovered[serial]
+                else:
+                    found[serial] = discovered[serial]
+
+    stale = {sn: ip for sn, ip in stale.items() if ip is not None}
+    missing = prior.keys() - found.keys() - stale.keys()
+    for serial in missing:
+        logger.warning('Could not locate bridge with Serial ID %s', serial)
+    return BulkResult(found, missing, stale)
+
+class BridgeDiff(namedtuple('BridgeDiff',
+                             ['added', 'removed', 'moved', 'unchanged', 'seen'])):
+    """ Changes found by `rediscover`
+
+    added     - dict of serial:URLBase for newly discovered bridges
+    removed   - dict of serial:URLBase (prior) for bridges no longer found
+    moved     - dict of serial:(prior URLBase, new URLBase)
+    unchanged - dict of serial:URLBase kept as is
+    seen      - dict of serial:timestamp for bridges confirmed this pass
+    """
+    __slots__ = ()
+
+    def table(self):
+        """ The updated serial:URLBase table """
+        table = dict(self.unchanged)
+        table.update(self.added)
+        table.update((sn, new) for sn, (old, new) in self.moved.items())
+        return table
+
+def rediscover(previous, seen=None, max_age=300, suspects=(), full=False,
+               now=None, precheck_timeout=PRECHECK_TIMEOUT):
+    """ Incrementally refresh a prior `find_bridges` result.
+
+    `previous` -- dictionary of serial:URLBase pairs from an earlier pass
+    `seen` -- optional dictionary of serial:timestamp of last confirmation,
+    entries confirmed within `max_age` seconds are trusted without any
+    network access.  Entries missing from `seen` are always checked.
+    `suspects` -- serials to re-verify regardless of age
+    `full` -- run discovery even if every checked entry verified, so
+    that newly installed bridges are reported as added
+    `precheck_timeout` -- applies as in `find_bridges`
+
+    Discovery only runs when a checked entry failed verification or
+    `full` is set.  Neither argument is modified; returns a `BridgeDiff`.
+    """
+    now = time.time() if now is None else now
+    seen = seen or {}
+    suspects = set(suspects)
+
+    unchanged, failed, confirmed, to_check, moved = {}, {}, {}, {}, {}
+    for serial, baseip in previous.items():
+        fresh = now - seen.get(serial, float('-inf')) <= max_age
+        if fresh and serial not in suspects:
+            unchanged[serial] = baseip
+            stats_count('cache_hits')
+        else:
+            to_check[serial] = _build_from(baseip)
+
+    reachable = _precheck(to_check.values(), precheck_timeout)
+    for serial, xmlurl in to_check.items():
+        baseip = previous[serial]
+        found_sn, found_ip = None, None
+        if xmlurl in reachable:
+            found_sn, found_ip = parse_description_xml(xmlurl)
+        if found_sn == serial:
+            if _same_base(found_ip, baseip):
+                unchanged[serial] = found_ip
+            else:
+                # same address answered with a new URLBase, e.g. port change
+                moved[serial] = (baseip, found_ip)
+            confirmed[serial] = now
+        else:
+            logger.info('%s not found at %s', serial, baseip)
+            failed[serial] = baseip
+
+    added, removed = {}, {}
+    if failed or full:
+        discovered = _discover()
+        for serial, baseip in discovered.items():
+            if serial in failed:
+                if not _same_base(baseip, failed[serial]):
+                    moved[serial] = (failed[serial], baseip)
+                else:
+                    unchanged[serial] = baseip
+                confirmed[serial] = now
+            elif serial not in previous:
+                added[serial] = baseip
+                confirmed[serial] = now
+        removed = {sn: ip for sn, ip in failed.items() if sn not in discovered}
+
+    logger.info('Rediscovery: %d added, %d removed, %d moved, %d unchanged',
+                len(added), len(removed), len(moved), len(unchanged))
+    return BridgeDiff(added, removed, moved, unchanged, confirmed)
+
 if __name__ == '__main__':
     from ssdp import discover as ssdp_discover
+    from mdns import discover as mdns_discover
+    import stats as stats_module
+    from stats import phase as stats_phase, count as stats_count
     logging.basicConfig(level=logging.INFO,                                                 \
         format='%(asctime)s.%(msecs)03d %(levelname)s:%(module)s:%(funcName)s: %(message)s', \
         datefmt="%Y-%m-%d %H:%M:%S")
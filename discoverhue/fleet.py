@@ -0,0 +1,215 @@
+""" Fleet aggregation across isolated network segments
+
+SSDP does not cross routers, so an `Agent` runs discovery on each segment
+and pushes only the changes since its last accepted push to a `Collector`
+over plain HTTP/JSON.  The collector merges every segment into a single
+serial:(segment, URLBase, last_seen) table for constant time lookups.
+
+Delta format posted to /delta:
+    {"segment": "lab", "seq": 7, "base": 6, "reset": false,
+     "upsert": {"0017884e7dad": "http://192.168.0.23:80/"},
+     "remove": ["001788102201"]}
+
+A collector that has not seen `base` for the segment (e.g. it restarted)
+replies 409 and the agent resends its full table with `reset` set.
+"""
+import json
+import threading
+import time
+import urllib.request
+from collections import namedtuple
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+import logging
+logger = logging.getLogger('discoverhue')
+
+FleetEntry = namedtuple('FleetEntry', ['segment', 'urlbase', 'last_seen'])
+
+class Agent(object):
+    """ Discover on the local segment and push deltas to a collector
+
+    `collector` -- base URL of the collector, e.g. http://10.0.0.5:8080
+    `segment` -- name identifying this network segment
+    `discover` -- callable returning a dict of serial:URLBase pairs,
+    defaults to `find_bridges`
+    `empty_runs` -- consecutive empty discoveries needed before `run_once`
+    clears the segment, a single miss keeps the pushed table
+    """
+    def __init__(self, collector, segment, discover=None, timeout=10,
+                 empty_runs=3):
+        self.collector = collector.rstrip('/')
+        self.segment = segment
+        self.timeout = timeout
+        self.empty_runs = empty_runs
+        self._empty = 0
+        self._discover = discover
+        self._pushed = {}
+        self._seq = 0
+
+    def delta(self, found):
+        """ Changes from the last accepted push to `found` """
+        upsert = {sn: ip for sn, ip in found.items() if self._pushed.get(sn) != ip}
+        remove = [sn for sn in self._pushed if sn not in found]
+        return upsert, remove
+
+    def push(self, found):
+        """ Send the delta for `found`, resending everything if refused
+
+        Returns True once the collector accepted the delta.  On failure the
+        last accepted state is kept, so the next push carries the changes.
+        """
+        found = {sn: str(ip) for sn, ip in found.items()}
+        reset = False
+        for _ in range(2):
+            upsert, remove = self.delta(found)
+            message = {'segment': self.segment, 'seq': self._seq + 1,
+                       'base': self._seq, 'reset': reset,
+                       'upsert': upsert, 'remove': remove}
+            try:
+                self._post('/delta', message)
+            except urllib.request.HTTPError as error:
+                if error.code != 409:
+                    logger.warning('Collector refused delta: %s', error)
+                    return False
+                logger.info('Collector out of sync, resending %s', self.segment)
+                self._pushed, reset = {}, True
+                continue
+            except urllib.request.URLError as error:
+                logger.warning('Collector unreachable: %s', error)
+                return False
+            self._pushed = found
+            self._seq += 1
+            logger.debug('Pushed %d upsert(s), %d removal(s)',
+                         len(upsert), len(remove))
+            return True
+        return False
+
+    def _post(self, path, message):
+        req = urllib.request.Request(
+            self.collector + path, data=json.dumps(message).encode(),
+            headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return response.read()
+
+    def run_once(self):
+        """ Discover and push a single time
+
+        An empty discovery is not pushed until it repeats `empty_runs`
+        times in a row; returns False while it is held back.
+        """
+        if self._discover is None:
+            from discoverhue.discoverhue import find_bridges
+            self._discover = find_bridges
+        found = self._discover()
+        if not found and self._pushed:
+            self._empty += 1
+            if self._empty < self.empty_runs:
+                logger.warning('Agent discovery found nothing (%d of %d), '
+                               'keeping prior table', self._empty, self.empty_runs)
+                return False
+        self._empty = 0
+        return self.push(found)
+
+    def run(self, interval=300, stop=None):
+        """ Discover and push every `interval` seconds until `stop` is set """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_once()
+            except Exception:   # keep the agent alive over a failed cycle
+                logger.exception('Agent discovery failed')
+            stop.wait(interval)
+
+class Collector(object):
+    """ Merged serial:FleetEntry table built from agent deltas """
+    def __init__(self):
+        self._table = {}
+        self._segments = {}     # segment: set of serials
+        self._seq = {}          # segment: last applied seq
+        self._lock = threading.Lock()
+
+    def apply(self, delta, now=None):
+        """ Merge one delta, returning False if its base is unknown """
+        now = time.time() if now is None else now
+        segment = delta['segment']
+        with self._lock:
+            if not delta.get('reset') and self._seq.get(segment, 0) != delta['base']:
+                return False
+            serials = self._segments.setdefault(segment, set())
+            if delta.get('reset'):
+                delta = dict(delta, remove=list(serials - set(delta['upsert'])))
+            for serial in delta['remove']:
+                entry = self._table.get(serial)
+                if entry is not None and entry.segment == segment:
+                    del self._table[serial]
+                serials.discard(serial)
+            for serial, urlbase in delta['upsert'].items():
+                moved_from = self._table.get(serial)
+                if moved_from is not None and moved_from.segment != segment:
+                    self._segments[moved_from.segment].discard(serial)
+                self._table[serial] = FleetEntry(segment, urlbase, now)
+                serials.add(serial)
+            # a delta, even an empty one, vouches for the whole segment
+            for serial in serials:
+                self._table[serial] = self._table[serial]._replace(last_seen=now)
+            self._seq[segment] = delta['seq']
+            return True
+
+    def get(self, serial):
+        """ FleetEntry for `serial` or None """
+        return self._table.get(serial)
+
+    def bridges(self):
+        """ Snapshot of the whole serial:FleetEntry table """
+        with self._lock:
+            return dict(self._table)
+
+    def serve(self, address=('', 8080)):
+        """ HTTP server for this collector, call `serve_forever` on it """
+        server = _ThreadingHTTPServer(address, _CollectorHandler)
+        server.collector = self
+        return server
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class _CollectorHandler(BaseHTTPRequestHandler):
+    """ POST /delta, GET /bridges, GET /bridges/<serial> """
+    def _reply(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != '/delta':
+            return self._reply(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            delta = json.loads(self.rfile.read(length).decode())
+            applied = self.server.collector.apply(delta)
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return self._reply(400, {'error': str(error)})
+        if applied:
+            self._reply(200, {'ok': True})
+        else:
+            self._reply(409, {'error': 'resend full table'})
+
+    def do_GET(self):
+        collector = self.server.collector
+        if self.path == '/bridges':
+            table = collector.bridges()
+            self._reply(200, {sn: e._asdict() for sn, e in table.items()})
+        elif self.path.startswith('/bridges/'):
+            entry = collector.get(self.path[len('/bridges/'):])
+            if entry is None:
+                self._reply(404, {'error': 'unknown serial'})
+            else:
+                self._reply(200, entry._asdict())
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def log_message(self, format, *args):
+        logger.debug('Collector %s: ' + format, self.address_string(), *args)
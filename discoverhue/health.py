@@ -0,0 +1,277 @@
+""" Continuous health checks for a fleet of known bridges
+
+`Monitor` keeps probing the description.xml of every known bridge and
+reports changes as they happen, rather than validating a whole table
+serially with `find_bridges(dict)`:
+
+    def report(event):
+        print(event.kind, event.serial, event.location)
+
+    monitor = Monitor({'0017884e7dad': '192.168.0.23', ...}, report)
+    monitor.start()
+
+Each bridge has its own interval.  It grows by `backoff` after every
+successful probe up to `max_interval`, and drops to `min_interval` after a
+failure so that an outage is confirmed quickly.  Due times carry random
+jitter so that bridges added together do not stay in lockstep.  At most
+`workers` probes are in flight at once.
+
+Events are `up` (first success, or recovery), `down` (after `failures`
+consecutive failed probes) and `moved` (the bridge answered at another
+address).  Moves are noticed when a probe reaches a different known
+bridge, and by handing the serials of down bridges to `locate`, which
+defaults to `find_bridges`, at most every `locate_interval` seconds.
+"""
+import heapq
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import logging
+logger = logging.getLogger('discoverhue')
+
+MIN_INTERVAL = 5.0
+MAX_INTERVAL = 60.0
+BACKOFF = 2.0
+JITTER = 0.1
+FAILURES = 2
+LOCATE_INTERVAL = 60.0
+PROBE_TIMEOUT = 1.0
+
+Event = namedtuple('Event', 'kind serial location previous time')
+
+class _Entry(object):
+    """ Probe state of one bridge """
+    __slots__ = ('serial', 'location', 'state', 'interval', 'failures', 'due',
+                 'busy')
+
+    def __init__(self, serial, location, interval):
+        self.serial = serial
+        self.location = location
+        self.state = 'unknown'
+        self.interval = interval
+        self.failures = 0
+        self.due = 0.0
+        self.busy = False
+
+class Monitor(object):
+    """ Scheduler probing known bridges with adaptive intervals
+
+    `bridges` -- dictionary of serial:address pairs, as for `find_bridges`
+    `callback` -- called with each `Event` from a worker thread, when
+    omitted events are put on the `events` queue instead
+    `workers` -- maximum concurrent probes
+    `locate` -- callable taking a list of serials and returning a dict of
+    serial:URLBase for those it found, None to disable
+    """
+    def __init__(self, bridges=None, callback=None, workers=64,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, jitter=JITTER, failures=FAILURES,
+                 timeout=PROBE_TIMEOUT, locate=False,
+                 locate_interval=LOCATE_INTERVAL, rng=None):
+        self.events = queue.Queue()
+        self.callback = callback or self.events.put
+        self.workers = workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.failures = failures
+        self.timeout = timeout
+        self.locate_interval = locate_interval
+        self.rng = rng or random.Random()
+        if locate is False:
+            from discoverhue.discoverhue import find_bridges
+            locate = find_bridges
+        self._locate = locate
+        self._last_locate = None
+        self._locating = False
+        self._entries = {}
+        self._heap = []
+        self._seq = 0
+        self._in_flight = 0
+        self._wake = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        for serial, address in (bridges or {}).items():
+            self.add(serial, address)
+
+    def add(self, serial, address):
+        """ Start monitoring `serial`, first probed within `min_interval` """
+        from discoverhue.discoverhue import _build_from
+        entry = _Entry(serial, _build_from(str(address)), self.min_interval)
+        with self._wake:
+            self._entries[serial] = entry
+            # spread the first round instead of probing everything at once
+            self._schedule(entry, time.monotonic(),
+                           self.rng.uniform(0, self.min_interval))
+            self._wake.notify()
+
+    def remove(self, serial):
+        """ Stop monitoring `serial` """
+        with self._wake:
+            self._entries.pop(serial, None)
+
+    def status(self):
+        """ Dictionary of serial:(state, description url) """
+        with self._wake:
+            return {sn: (e.state, e.location) for sn, e in self._entries.items()}
+
+    def _schedule(self, entry, now, delay):
+        entry.due = now + delay
+        self._seq += 1
+        heapq.heappush(self._heap, (entry.due, self._seq, entry.serial))
+
+    def _delay(self, interval):
+        return interval * (1 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _probe(self, url):
+        """ (serial, Bridge) answering at `url`, or (None, reason) """
+        from discoverhue import discoverhue as dh
+        if not dh._precheck([url], self.timeout):
+            return None, 'unreachable'
+        try:
+            return dh.parse_description_xml(url)
+        except Exception as error:   # junk at the address counts as down
+            return None, error
+
+    def _check(self, serial, url):
+        try:
+            found, info = self._probe(url)
+        except Exception:
+            logger.exception('Health probe of %s failed', url)
+            found, info = None, None
+        if found is None:
+            logger.debug('Bridge %s not answering at %s: %s', serial, url, info)
+        events = []
+        now = time.monotonic()
+        with self._wake:
+            self._in_flight -= 1
+            entry = self._entries.get(serial)
+            if entry is not None and entry.location == url:
+                entry.busy = False
+                if found == serial:
+                    self._succeeded(entry, events)
+                else:
+                    self._failed(entry, events)
+                    other = self._entries.get(found)
+                    if other is not None and other.location != url:
+                        # another known bridge took over this address
+                        self._moved(other, url, events)
+                        self._succeeded(other, events)
+                self._schedule(entry, now, self._delay(entry.interval))
+            self._wake.notify()
+        self._emit(events)
+
+    def _succeeded(self, entry, events):
+        entry.failures = 0
+        if entry.state != 'up':
+            entry.state = 'up'
+            entry.interval = self.min_interval
+            events.append(Event('up', entry.serial, entry.location, None, time.time()))
+        else:
+            entry.interval = min(entry.interval * self.backoff, self.max_interval)
+
+    def _failed(self, entry, events):
+        entry.failures += 1
+        entry.interval = self.min_interval
+        if entry.failures >= self.failures and entry.state != 'down':
+            entry.state = 'down'
+            events.append(Event('down', entry.serial, entry.location, None, time.time()))
+
+    def _moved(self, entry, url, events):
+        events.append(Event('moved', entry.serial, url, entry.location, time.time()))
+        entry.location = url
+        entry.busy = False
+        # results still in flight for the old address are ignored
+        self._schedule(entry, time.monotonic(), self._delay(self.min_interval))
+
+    def _emit(self, events):
+        for event in events:
+            logger.info('Bridge %s %s at %s', event.serial, event.kind, event.location)
+            try:
+                self.callback(event)
+            except Exception:
+                logger.exception('Health event callback failed')
+
+    def _run_locate(self, serials):
+        from discoverhue.discoverhue import _build_from
+        try:
+            found = self._locate(serials) or {}
+        except Exception:
+            logger.exception('Locating down bridges failed')
+            found = {}
+        events = []
+        with self._wake:
+            self._locating = False
+            self._in_flight -= 1
+            for serial, urlbase in found.items():
+                entry = self._entries.get(serial)
+                if entry is None or entry.state != 'down':
+                    continue
+                url = _build_from(str(urlbase))
+                if url != entry.location:
+                    self._moved(entry, url, events)
+                self._succeeded(entry, events)
+            self._wake.notify()
+        self._emit(events)
+
+    def _due(self, now):
+        """ Submit due work while workers are free, returns seconds to wait """
+        if self._locate and not self._locating and self._in_flight < self.workers and (
+                self._last_locate is None
+                or now - self._last_locate >= self.locate_interval):
+            down = [sn for sn, e in self._entries.items() if e.state == 'down']
+            if down:
+                self._locating = True
+                self._last_locate = now
+                self._in_flight += 1
+                self._executor.submit(self._run_locate, down)
+        while self._heap and self._in_flight < self.workers:
+            due, seq, serial = self._heap[0]
+            entry = self._entries.get(serial)
+            if entry is None or entry.due != due or entry.busy:
+                heapq.heappop(self._heap)   # removed or rescheduled
+                continue
+            if due > now:
+                return due - now
+            heapq.heappop(self._heap)
+            entry.busy = True
+            self._in_flight += 1
+            self._executor.submit(self._check, serial, entry.location)
+        # idle or saturated, woken by add() or a finished probe
+        return self.min_interval
+
+    def run(self):
+        """ Probe until `stop` is called """
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            with self._wake:
+                while not self._stop.is_set():
+                    self._wake.wait(self._due(time.monotonic()))
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def start(self):
+        """ Run in a background thread """
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop scheduling probes and wait for those in flight """
+        self._stop.set()
+        with self._wake:
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,155 @@
+""" Minimal DNS-SD over multicast DNS
+
+Sends a single PTR query for a service type and assembles the PTR, SRV,
+TXT and A records of the replies into one `MDNSService` per instance.
+Queries go out from an ephemeral port, so responders answer by unicast
+(RFC 6762 section 6.7) and no membership of the multicast group is needed.
+"""
+import socket
+import struct
+import time
+import logging
+logger = logging.getLogger('mdns')
+
+GROUP = ("224.0.0.251", 5353)
+TYPE_A, TYPE_PTR, TYPE_TXT, TYPE_SRV = 1, 12, 16, 33
+
+class MDNSService(object):
+    """ One advertised service instance """
+    def __init__(self, name):
+        self.name = name
+        self.target = None
+        self.port = None
+        self.address = None
+        self.properties = {}
+    def __repr__(self):
+        return "<MDNSService({name}, {address}, {port}, {properties})>".format(**self.__dict__)
+
+def build_query(service):
+    """ DNS message with a single PTR question for `service` """
+    header = struct.pack('!6H', 0, 0, 1, 0, 0, 0)
+    return header + _encode_name(service) + struct.pack('!2H', TYPE_PTR, 1)
+
+def _encode_name(name):
+    labels = [label.encode('utf-8') for label in name.strip('.').split('.')]
+    return b''.join(struct.pack('B', len(l)) + l for l in labels) + b'\0'
+
+def _decode_name(data, offset):
+    """ Read a possibly compressed name, returning it and the next offset """
+    labels = []
+    end = None
+    for _ in range(128):        # bound pointer loops in hostile packets
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from('!H', data, offset)[0] & 0x3FFF
+        elif length:
+            labels.append(data[offset+1:offset+1+length].decode('utf-8', 'replace'))
+            offset += 1 + length
+        else:
+            return '.'.join(labels) + '.', end if end is not None else offset + 1
+    raise ValueError('Name compression loop')
+
+def parse_records(data):
+    """ All resource records of a DNS message as (name, type, value) tuples
+
+    value is the target name for PTR, (port, target) for SRV, the dotted
+    address for A, a dict for TXT, and the raw bytes for anything else.
+    Malformed messages raise ValueError, struct.error or IndexError.
+    """
+    _, flags, qdcount, ancount, nscount, arcount = struct.unpack_from('!6H', data)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _decode_name(data, offset)
+        offset += 4
+    records = []
+    for _ in range(ancount + nscount + arcount):
+        name, offset = _decode_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack_from('!2HIH', data, offset)
+        offset += 10
+        rdata = data[offset:offset+rdlength]
+        if rtype == TYPE_PTR:
+            value = _decode_name(data, offset)[0]
+        elif rtype == TYPE_SRV:
+            port = struct.unpack_from('!H', data, offset+4)[0]
+            value = (port, _decode_name(data, offset+6)[0])
+        elif rtype == TYPE_A and rdlength == 4:
+            value = socket.inet_ntoa(rdata)
+        elif rtype == TYPE_TXT:
+            value, i = {}, 0
+            while i < len(rdata):
+                entry = rdata[i+1:i+1+rdata[i]].decode('utf-8', 'replace')
+                key, _, val = entry.partition('=')
+                value[key.lower()] = val
+                i += 1 + rdata[i]
+        else:
+            value = rdata
+        records.append((name.lower(), rtype, value))
+        offset += rdlength
+    return records
+
+def _assemble(records, services, addresses):
+    """ Fold records into the services and addresses seen so far """
+    for name, rtype, value in records:
+        if rtype == TYPE_PTR:
+            services.setdefault(value.lower(), MDNSService(value))
+        elif rtype == TYPE_A:
+            addresses[name] = value
+    for name, rtype, value in records:
+        service = services.get(name)
+        if service is None:
+            continue
+        if rtype == TYPE_SRV:
+            service.port, service.target = value[0], value[1].lower()
+        elif rtype == TYPE_TXT:
+            service.properties.update(value)
+    for service in services.values():
+        if service.target in addresses:
+            service.address = addresses[service.target]
+
+def discover(service, timeout=1, until=None, group=GROUP):
+    """ Query `service` and collect replies for up to `timeout` seconds
+
+    `until` -- optional callable given the list of complete services,
+    returning True ends the wait early
+    """
+    service = service.rstrip('.') + '.'
+    services, addresses = {}, {}
+    deadline = time.monotonic() + timeout
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as sock:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+        logger.debug('PTR query for %s', service)
+        sock.sendto(build_query(service), group)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, addr = sock.recvfrom(9000)
+            except socket.timeout:
+                break
+            try:
+                records = parse_records(data)
+            except (ValueError, struct.error, IndexError) as error:
+                logger.debug('Malformed reply from %s: %s', addr[0], error)
+                continue
+            _assemble(records, services, addresses)
+            logger.debug('Reply from %s', addr[0])
+            complete = [s for s in services.values() if s.address and s.port]
+            if until is not None and until(complete):
+                break
+    return [s for s in services.values() if s.address and s.port]
+
+# Example:
+# import mdns
+# mdns.discover("_hue._tcp.local")
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG,                                                 \
+        format='%(asctime)s.%(msecs)03d %(levelname)s:%(module)s:%(funcName)s: %(message)s', \
+        datefmt="%Y-%m-%d %H:%M:%S")
+
+    services = discover("_hue._tcp.local", timeout=2)
+    print('\nDiscovered {} service{pl}.'.format(len(services), pl='s' if len(services)!=1 else ''))
+    for service in services: print('  {0.address}:{0.port} ==> {0.name}'.format(service))
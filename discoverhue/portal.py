@@ -0,0 +1,139 @@
+""" Cached client for the N-UPnP discovery portal
+
+Every `via_nupnp` call fetches the portal list, and fleets discovering in
+bursts get rate limited.  `PortalClient` keeps the last answer for `ttl`
+seconds, then revalidates it with If-None-Match / If-Modified-Since so an
+unchanged list costs a 304.  A 429 (or 503) starts a backoff that honours
+Retry-After and doubles on each further refusal; meanwhile the cached
+list is served, and with nothing cached `Throttled` is raised without
+contacting the portal.
+
+Install one for `parse_portal_json`, and so for `find_bridges`:
+
+    from discoverhue import discoverhue, portal
+    discoverhue.portal_client = portal.PortalClient(ttl=600)
+
+The client talks to the portal itself, so capture.Recorder does not see
+its requests.
+"""
+import email.utils
+import threading
+import time
+import urllib.request
+from discoverhue.stats import count as stats_count
+import logging
+logger = logging.getLogger('discoverhue')
+
+TTL = 300
+BACKOFF = 30
+MAX_BACKOFF = 3600
+TIMEOUT = 5
+THROTTLE_CODES = (429, 503)
+
+class Throttled(urllib.request.URLError):
+    """ Portal refused the request and no cached list is available """
+
+def retry_after(value, now=None):
+    """ Seconds from a Retry-After header value, None when unusable """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+class PortalClient(object):
+    """ Portal list with a TTL cache, conditional requests and backoff
+
+    `url` -- portal address, defaults to `discoverhue.PORTAL_URL` as set
+    when fetching
+    `ttl` -- seconds a fetched list is used without asking the portal
+    `backoff` -- first delay after a refusal without Retry-After, doubled
+    per consecutive refusal up to `max_backoff`
+    `clock` -- wall time source, replaceable for testing
+    """
+    def __init__(self, url=None, ttl=TTL, backoff=BACKOFF, max_backoff=MAX_BACKOFF,
+                 timeout=TIMEOUT, clock=time.time):
+        self.url = url
+        self.ttl = ttl
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.clock = clock
+        self.body = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched = None
+        self.retry_at = None
+        self.refusals = 0
+        self._lock = threading.Lock()
+
+    def _url(self):
+        if self.url is not None:
+            return self.url
+        from discoverhue.discoverhue import PORTAL_URL
+        return PORTAL_URL
+
+    def _request(self, headers):
+        """ (headers, body) of a GET, HTTPError for anything but 200 """
+        req = urllib.request.Request(self._url(), headers=headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return response.headers, response.read().decode()
+
+    def _refused(self, error, now):
+        self.refusals += 1
+        delay = min(self.backoff * 2 ** (self.refusals - 1), self.max_backoff)
+        hinted = retry_after(error.headers.get('Retry-After') if error.headers else None, now)
+        if hinted is not None:
+            delay = max(delay, hinted)
+        self.retry_at = now + delay
+        stats_count('portal_throttled')
+        logger.warning('Portal refused with %d, backing off %.0fs', error.code, delay)
+
+    def fetch(self):
+        """ Portal JSON text, from the cache while fresh or backing off
+
+        Raises HTTPError for other portal errors, URLError when it cannot be
+        reached and `Throttled` when refused with nothing cached.
+        """
+        with self._lock:
+            now = self.clock()
+            if self.body is not None and now - self.fetched < self.ttl:
+                stats_count('portal_cache_hits')
+                return self.body
+            if self.retry_at is not None and now < self.retry_at:
+                return self._cached('backing off for {:.0f}s'.format(self.retry_at - now))
+
+            headers = {}
+            if self.body is not None:
+                if self.etag:
+                    headers['If-None-Match'] = self.etag
+                if self.last_modified:
+                    headers['If-Modified-Since'] = self.last_modified
+            try:
+                response_headers, body = self._request(headers)
+            except urllib.request.HTTPError as error:
+                if error.code == 304 and self.body is not None:
+                    stats_count('portal_not_modified')
+                    self.fetched, self.retry_at, self.refusals = now, None, 0
+                    return self.body
+                if error.code in THROTTLE_CODES:
+                    self._refused(error, now)
+                    return self._cached('refused with {}'.format(error.code))
+                raise
+            self.body = body
+            self.etag = response_headers.get('ETag')
+            self.last_modified = response_headers.get('Last-Modified')
+            self.fetched, self.retry_at, self.refusals = now, None, 0
+            return body
+
+    def _cached(self, reason):
+        if self.body is None:
+            raise Throttled('portal ' + reason)
+        logger.info('Portal %s, serving cached list', reason)
+        return self.body
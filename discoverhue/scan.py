@@ -0,0 +1,220 @@
+""" Prioritized IP scanning for bridges
+
+Rather than surveying a whole subnet in arbitrary order, hosts are probed
+most likely first: addresses where bridges were seen before, then hosts
+in the neighbor (ARP) table, then the ranges DHCP servers typically hand
+out, then everything else.  Confirmed bridges are yielded as they are
+found, so a caller looking for one moved bridge usually stops after a
+handful of probes.
+
+Each batch of hosts first gets the concurrent TCP connect check of
+`find_bridges`, and only hosts with an open port have their
+description.xml read.
+
+`sweep` covers explicit routed networks, given as CIDRs or address ranges,
+concurrently.  Probes are shared out round-robin between the targets with
+a global and a per-target limit, so one large /16 cannot starve a /24:
+
+    for serial, bridge in sweep(['10.1.0.0/16', '10.2.0.10-10.2.0.90'],
+                                progress=print):
+        ...
+"""
+import ipaddress
+import queue
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from discoverhue import discoverhue as dh
+import logging
+logger = logging.getLogger('discoverhue')
+
+# host offsets within a /24, in the order consumer routers favour for DHCP
+DHCP_RANGES = [(100, 200), (2, 100), (200, 255)]
+BATCH = 32
+PROBE_TIMEOUT = 0.3
+WORKERS = 256
+PER_TARGET = 64
+
+Progress = namedtuple('Progress', 'target probed total found')
+
+def neighbors(path='/proc/net/arp'):
+    """ Addresses in the kernel neighbor table, empty where unavailable """
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return []
+    # IP address, HW type, Flags, HW address, Mask, Device; flag 0x0 is incomplete
+    return [l.split()[0] for l in lines if len(l.split()) >= 4 and l.split()[2] != '0x0']
+
+def _dhcp_rank(address):
+    offset = int(address) & 0xff
+    for rank, (low, high) in enumerate(DHCP_RANGES):
+        if low <= offset < high:
+            return rank
+    return len(DHCP_RANGES)
+
+def prioritize(network, seen=(), neighbor_hosts=()):
+    """ Host addresses of `network` as strings, most likely bridges first
+
+    `seen` -- addresses (or URLs) where bridges were found before
+    `neighbor_hosts` -- addresses from the neighbor table
+    """
+    network = ipaddress.ip_network(network, strict=False)
+    ordered, queued = [], set()
+    def add(address):
+        if address not in queued and address in network:
+            queued.add(address)
+            ordered.append(address)
+
+    for group in (seen, neighbor_hosts):
+        for host in group:
+            try:
+                add(ipaddress.ip_address(str(host)))
+            except ValueError:
+                # urlbase or host:port as kept in prior_bridges
+                hostname = dh.urlsplit(dh._build_from(str(host))).hostname
+                try:
+                    add(ipaddress.ip_address(hostname or ''))
+                except ValueError:
+                    continue
+    rest = [a for a in network.hosts() if a not in queued]
+    rest.sort(key=_dhcp_rank)
+    return [str(a) for a in ordered] + [str(a) for a in rest]
+
+def _describe(url):
+    """ parse_description_xml, treating a malformed answer as no bridge """
+    try:
+        return dh.parse_description_xml(url)
+    except Exception as error:   # router pages and the like
+        logger.info('Bad description at %s: %s', url, error)
+        return None, None
+
+def probe(hosts, wanted=None, workers=BATCH, timeout=PROBE_TIMEOUT):
+    """ Yield (serial, Bridge) for each bridge confirmed among `hosts`
+
+    Hosts are probed in order in batches of `workers`.  With `wanted`
+    serials, probing stops after the batch in which the last one is found.
+    """
+    wanted = set(wanted or ())
+    remaining = set(wanted)
+    hosts = list(hosts)
+    probed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(hosts), workers):
+            urls = [dh._build_from(h) for h in hosts[start:start+workers]]
+            reachable = dh._precheck(urls, timeout)
+            probed += len(urls)
+            ordered = [u for u in urls if u in reachable]
+            for serial, bridge in executor.map(_describe, ordered):
+                if serial:
+                    if isinstance(bridge, dh.Bridge):
+                        bridge.source = 'scan'
+                    remaining.discard(serial)
+                    yield serial, bridge
+            if wanted and not remaining:
+                logger.info('Scan found all wanted bridges after %d probes', probed)
+                return
+    logger.info('Scan probed %d hosts', probed)
+
+def parse_target(target):
+    """ (label, network or None, hosts) for a CIDR, range or single address
+
+    Ranges are 'first-last' with either a full last address or only its
+    final octet, '10.0.0.10-10.0.0.90' or '10.0.0.10-90'.
+    Raises ValueError for anything else.
+    """
+    target = str(target).strip()
+    if '-' in target:
+        first, last = (part.strip() for part in target.split('-', 1))
+        first = ipaddress.ip_address(first)
+        if '.' not in last and ':' not in last:
+            last = '.'.join(str(first).split('.')[:3] + [last])
+        last = ipaddress.ip_address(last)
+        if last < first:
+            raise ValueError('empty range ' + target)
+        hosts = [str(ipaddress.ip_address(a)) for a in range(int(first), int(last) + 1)]
+        return target, None, hosts
+    network = ipaddress.ip_network(target, strict=False)
+    if network.num_addresses == 1:
+        return target, None, [str(network.network_address)]
+    return str(network), network, None
+
+class _Target(object):
+    """ Hosts left to probe in one target and its share of the workers """
+    def __init__(self, label, hosts):
+        self.label = label
+        self.pending = deque(hosts)
+        self.total = len(self.pending)
+        self.probed = 0
+        self.found = 0
+        self.in_flight = 0
+
+def _probe_host(target, url, timeout):
+    try:
+        if not dh._precheck([url], timeout):
+            return target, None
+    except Exception as error:
+        logger.info('Precheck of %s failed: %s', url, error)
+        return target, None
+    return target, _describe(url)
+
+def sweep(targets, wanted=None, workers=WORKERS, per_target=PER_TARGET,
+          timeout=PROBE_TIMEOUT, seen=(), neighbor_hosts=(), progress=None):
+    """ Yield (serial, Bridge) for each bridge confirmed in `targets`
+
+    `targets` -- CIDRs, ranges or addresses, see `parse_target`
+    `wanted` -- serials to look for, stops once all of them are found
+    `workers` -- probes in flight across all targets
+    `per_target` -- probes in flight within any one target
+    `seen`, `neighbor_hosts` -- probed first within networks, as for
+    `prioritize`
+    `progress` -- called with a `Progress` after every probe
+    """
+    parsed = []
+    for target in targets:
+        label, network, hosts = parse_target(target)
+        if network is not None:
+            hosts = prioritize(network, seen, neighbor_hosts)
+        parsed.append(_Target(label, hosts))
+    wanted = set(wanted or ())
+    remaining = set(wanted)
+    results = queue.Queue()
+    in_flight = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # one host per target and pass keeps the targets interleaved
+            submitted = True
+            while submitted and in_flight < workers:
+                submitted = False
+                for target in parsed:
+                    if in_flight >= workers:
+                        break
+                    if target.pending and target.in_flight < per_target:
+                        url = dh._build_from(target.pending.popleft())
+                        future = executor.submit(_probe_host, target, url, timeout)
+                        future.add_done_callback(lambda f: results.put(f.result()))
+                        target.in_flight += 1
+                        in_flight += 1
+                        submitted = True
+            if not in_flight:
+                break
+            target, answer = results.get()
+            in_flight -= 1
+            target.in_flight -= 1
+            target.probed += 1
+            serial, bridge = answer if answer else (None, None)
+            if serial:
+                target.found += 1
+                if isinstance(bridge, dh.Bridge):
+                    bridge.source = 'scan'
+                remaining.discard(serial)
+            if progress is not None:
+                progress(Progress(target.label, target.probed, target.total, target.found))
+            if serial:
+                yield serial, bridge
+                if wanted and not remaining:
+                    logger.info('Sweep found all wanted bridges')
+                    # abandon queued hosts, probes in flight still finish
+                    for target in parsed:
+                        target.pending.clear()
+    logger.info('Sweep probed %d hosts', sum(t.probed for t in parsed))
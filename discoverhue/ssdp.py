@@ -21,6 +21,8 @@ from urllib.parse import urlsplit
 import logging
 logger = logging.getLogger('ssdp')
 
+GROUP = ("239.255.255.250", 1900)
+
 class SSDPResponse(object):
     class _FakeSocket(io.BytesIO):
         def makefile(self, *args, **kw):
@@ -36,8 +38,11 @@ class SSDPResponse(object):
     def __repr__(self):
         return "<SSDPResponse({location}, {st}, {usn}, {server})>".format(**self.__dict__)
 
-def discover(service, timeout=5, retries=1, mx=3):
-    group = ("239.255.255.250", 1900)
+def discover(service, timeout=5, retries=1, mx=3, group=GROUP, callback=None):
+    """ M-SEARCH for `service`, collecting replies until `timeout` passes
+
+    `callback` -- optional callable given each raw reply as it arrives
+    """
     message = "\r\n".join([
         'M-SEARCH * HTTP/1.1',
         'HOST: {0}:{1}',
@@ -66,7 +71,10 @@ def discover(service, timeout=5, retries=1, mx=3):
 
         while True:
             try:
-                response = SSDPResponse(sock.recv(1024))
+                data = sock.recv(1024)
+                if callback is not None:
+                    callback(data)
+                response = SSDPResponse(data)
                 responses[response.location] = response
                 logger.debug('Response from %s',urlsplit(response.location).netloc)
             except socket.timeout:
@@ -0,0 +1,104 @@
+""" Opt-in timing and counters for discovery
+
+Discovery code reports through the module level `phase` and `count`
+helpers, which do nothing unless a `Stats` object is bound to the calling
+thread, so the disabled cost is one attribute lookup per call site.
+
+    stats = Stats()
+    find_bridges(stats=stats)
+    print(stats.as_dict())
+
+or bind it around any discovery call:
+
+    with Stats() as stats:
+        find_bridges_many(serials)
+
+Setting the module level `sink` to a callable makes every `find_bridges`
+call collect stats and hand them to it, e.g. for export to a metrics
+system without touching the calling code.
+
+Phases recorded: find_bridges, precheck, description, ssdp, mdns,
+portal, scan.  Counters include description_requests, timeouts,
+ssdp_packets, ssdp_filtered, cache_hits and cache_misses.
+"""
+import threading
+import time
+
+sink = None
+_local = threading.local()
+
+class Stats(object):
+    """ Per-phase durations and event counters
+
+    `phases` -- dictionary of name:[calls, total seconds, longest seconds]
+    `counters` -- dictionary of name:count
+    """
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self._outer = []
+
+    def add_time(self, name, seconds):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """ JSON friendly copy of everything recorded """
+        return {
+            'phases': {name: {'calls': calls, 'total': total, 'max': longest}
+                       for name, (calls, total, longest) in self.phases.items()},
+            'counters': dict(self.counters),
+        }
+
+    def __enter__(self):
+        self._outer.append(getattr(_local, 'stats', None))
+        _local.stats = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.stats = self._outer.pop()
+
+    def __repr__(self):
+        return '<Stats({phases}, {counters})>'.format(**self.__dict__)
+
+class _Phase(object):
+    __slots__ = ('stats', 'name', 'start')
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+    def __enter__(self):
+        self.start = time.perf_counter()
+    def __exit__(self, *exc):
+        self.stats.add_time(self.name, time.perf_counter() - self.start)
+
+class _NoPhase(object):
+    __slots__ = ()
+    def __enter__(self):
+        pass
+    def __exit__(self, *exc):
+        pass
+
+_NO_PHASE = _NoPhase()
+
+def current():
+    """ Stats bound to this thread, or None """
+    return getattr(_local, 'stats', None)
+
+def phase(name):
+    """ Context manager timing `name` into the bound stats, if any """
+    stats = getattr(_local, 'stats', None)
+    return _NO_PHASE if stats is None else _Phase(stats, name)
+
+def count(name, n=1):
+    """ Add `n` to counter `name` of the bound stats, if any """
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.count(name, n)
@@ -0,0 +1,173 @@
+""" Adaptive ordering of discovery methods
+
+`Strategy` remembers, per network, how often each discovery method found
+bridges and how long it took, and orders the methods for the next run so
+the historically fastest successful method goes first.  Sites where SSDP
+is blocked stop paying its fixed listening window once the portal or a
+scan has proven faster.  Occasionally a different method is moved to the
+front so that stats for the others stay current.
+
+    strategy = Strategy()           # persisted in the cache directory
+    find_bridges(strategy=strategy)
+
+Stats are kept as JSON, network:method:{tries, successes, latency} where
+latency is an exponentially weighted average of successful runs.
+"""
+import json
+import os
+import random
+import threading
+import logging
+logger = logging.getLogger('discoverhue')
+
+EXPLORE = 0.1
+SMOOTHING = 0.3
+
+def default_path():
+    """ Strategy stats file next to the result cache """
+    from discoverhue.cache import default_path as cache_path
+    return os.path.join(os.path.dirname(cache_path()), 'strategy.json')
+
+# destinations used only to pick the outbound interface, nothing is sent
+PROBE_DESTINATIONS = [('239.255.255.250', 1900), ('192.0.2.1', 9)]
+
+def _outbound_address():
+    """ Address of the interface carrying traffic to the LAN, or None """
+    import ipaddress
+    import socket
+    for destination in PROBE_DESTINATIONS:
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.connect(destination)
+                address = sock.getsockname()[0]
+        except OSError:
+            continue
+        ip = ipaddress.ip_address(address)
+        if not (ip.is_loopback or ip.is_unspecified):
+            return address
+    return None
+
+def _gateway(path='/proc/net/route'):
+    """ IPv4 default gateway from the kernel routing table, or None """
+    import ipaddress
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return None
+    # Iface, Destination, Gateway, Flags, ... in little-endian hex
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 3 and fields[1] == '00000000':
+            try:
+                return str(ipaddress.ip_address(bytes.fromhex(fields[2])[::-1]))
+            except ValueError:
+                continue
+    return None
+
+def network_key():
+    """ Identify the local network by its outbound /24 and default gateway
+
+    Falls back to the addresses the host name resolves to, which on many
+    systems are only loopback, and finally to 'unknown'.
+    """
+    import ipaddress
+    import socket
+    address = _outbound_address()
+    if address:
+        hosts = [address]
+    else:
+        try:
+            hosts = socket.gethostbyname_ex(socket.gethostname())[2]
+        except OSError:
+            hosts = []
+        hosts = [h for h in hosts if not ipaddress.ip_address(h).is_loopback]
+    networks = sorted({str(ipaddress.ip_interface(h + '/24').network) for h in hosts})
+    if not networks:
+        return 'unknown'
+    gateway = _gateway()
+    if gateway:
+        networks.append('via ' + gateway)
+    return ','.join(networks)
+
+class Strategy(object):
+    """ Learned per-network ordering of discovery methods
+
+    `path` -- JSON stats file, defaults to `default_path()`, None in
+    combination with `persist=False` keeps stats in memory only
+    `network` -- key for the current network, defaults to `network_key()`
+    `explore` -- probability of trying a random other method first
+    """
+    def __init__(self, path=None, network=None, explore=EXPLORE, persist=True,
+                 rng=None):
+        self.path = path or (default_path() if persist else None)
+        self.explore = explore
+        self.rng = rng or random.Random()
+        self._network = network
+        self._lock = threading.Lock()
+        self._stats = self._load()
+
+    @property
+    def network(self):
+        if self._network is None:
+            self._network = network_key()
+        return self._network
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return stats if isinstance(stats, dict) else {}
+
+    def save(self):
+        """ Write stats for every network back to `path` """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp = '{}.{}.tmp'.format(self.path, os.getpid())
+        with self._lock:
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self._stats, f, indent=1, sort_keys=True)
+        os.replace(temp, self.path)
+
+    def stats(self, method):
+        """ Dictionary of tries, successes and latency for `method` here """
+        return dict(self._stats.get(self.network, {}).get(method, {}))
+
+    def _score(self, method, position):
+        entry = self._stats.get(self.network, {}).get(method)
+        if not entry or not entry.get('tries'):
+            # untried methods keep their default order behind proven ones
+            return (1, 0.0, position)
+        rate = entry['successes'] / entry['tries']
+        if not entry['successes']:
+            return (2, -rate, position)
+        # expected cost: latency if it works, plus a retry penalty if not
+        return (0, entry['latency'] / rate, position)
+
+    def order(self, methods):
+        """ `methods` names sorted best first, sometimes exploring """
+        ordered = sorted(methods, key=lambda m: self._score(m, methods.index(m)))
+        if len(ordered) > 1 and self.rng.random() < self.explore:
+            probe = self.rng.choice(ordered[1:])
+            ordered.remove(probe)
+            ordered.insert(0, probe)
+            logger.debug('Strategy exploring %s first', probe)
+        return ordered
+
+    def record(self, method, success, seconds):
+        """ Update the stats for one run of `method` """
+        with self._lock:
+            entry = self._stats.setdefault(self.network, {}).setdefault(
+                method, {'tries': 0, 'successes': 0, 'latency': None})
+            entry['tries'] += 1
+            if success:
+                entry['successes'] += 1
+                latency = entry['latency']
+                entry['latency'] = seconds if latency is None else (
+                    SMOOTHING * seconds + (1 - SMOOTHING) * latency)
+        logger.debug('Strategy %s: %s in %.3fs', method, success, seconds)
@@ -0,0 +1,286 @@
+""" Simulated network of fake Hue bridges for load testing discovery
+
+`FakeNetwork` runs an SSDP responder and an HTTP server in one asyncio
+event loop on a background thread, emulating any number of bridges with
+distinct serials plus non-Hue UPnP devices as noise.  Point discovery at
+it with the `group` argument of `ssdp.discover` and the locations it
+returns, or with `PORTAL_URL` for the N-UPnP portal:
+
+    with FakeNetwork(bridges=1000, noise=200) as net:
+        found = ssdp.discover('ssdp:all', timeout=1, group=net.ssdp_address)
+        serial, baseip = parse_description_xml(found[0].location)
+
+Each device gets its own HTTP path under a single port, i.e.
+http://127.0.0.1:<port>/<id>/description.xml.  Per-device latency and
+a loss probability can be injected; lost SSDP replies are dropped and lost
+HTTP requests answered with 503.
+
+The portal stand-in answers conditional requests with 304 while the list
+is unchanged, and the next `throttle` portal requests with 429 and a
+`Retry-After` of `retry_after` seconds.
+"""
+import asyncio
+import json
+import random
+import socket
+import struct
+import threading
+import zlib
+from collections import namedtuple
+import logging
+logger = logging.getLogger('discoverhue')
+
+FakeDevice = namedtuple('FakeDevice', ['id', 'hue', 'latency'])
+
+HUE_DESCRIPTION = """<?xml version="1.0" encoding="UTF-8" ?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+   <specVersion><major>1</major><minor>0</minor></specVersion>
+   <URLBase>{urlbase}</URLBase>
+   <device>
+      <deviceType>urn:schemas-upnp-org:device:Basic:1</deviceType>
+      <friendlyName>Philips hue ({host})</friendlyName>
+      <manufacturer>Royal Philips Electronics</manufacturer>
+      <modelDescription>Philips hue Personal Wireless Lighting</modelDescription>
+      <modelName>Philips hue bridge 2015</modelName>
+      <modelNumber>BSB002</modelNumber>
+      <serialNumber>{id}</serialNumber>
+      <UDN>uuid:2f402f80-da50-11e1-9b23-{id}</UDN>
+   </device>
+</root>"""
+
+NOISE_DESCRIPTION = """<?xml version="1.0" encoding="UTF-8" ?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+   <specVersion><major>1</major><minor>0</minor></specVersion>
+   <URLBase>{urlbase}</URLBase>
+   <device>
+      <deviceType>urn:schemas-upnp-org:device:MediaServer:1</deviceType>
+      <friendlyName>Media server ({host})</friendlyName>
+      <manufacturer>Acme</manufacturer>
+      <modelName>MiniDLNA</modelName>
+      <serialNumber>{id}</serialNumber>
+      <UDN>uuid:4d696e69-444c-164e-9d41-{id}</UDN>
+   </device>
+</root>"""
+
+SSDP_REPLY = "\r\n".join([
+    'HTTP/1.1 200 OK',
+    'CACHE-CONTROL: max-age=100',
+    'EXT:',
+    'LOCATION: {location}',
+    'SERVER: {server}',
+    'ST: upnp:rootdevice',
+    'USN: uuid:{uuid}::upnp:rootdevice', '', ''])
+
+HUE_SERVER = 'Linux/3.14.0 UPnP/1.0 IpBridge/1.14.0'
+NOISE_SERVER = 'Linux/4.4 DLNADOC/1.50 UPnP/1.0 MiniDLNA/1.2.1'
+
+class _SSDPResponder(asyncio.DatagramProtocol):
+    """ Answer every M-SEARCH with one reply per device """
+    def __init__(self, network):
+        self.network = network
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if not data.startswith(b'M-SEARCH'):
+            return
+        net = self.network
+        net.searches += 1
+        loop = asyncio.get_event_loop()
+        for device in net.devices.values():
+            if net.rng.random() < net.loss:
+                continue
+            reply = SSDP_REPLY.format(
+                location=net.location(device.id),
+                server=HUE_SERVER if device.hue else NOISE_SERVER,
+                uuid=net.uuid(device)).encode()
+            loop.call_later(device.latency + net.rng.uniform(0, net.spread),
+                            self.transport.sendto, reply, addr)
+
+class FakeNetwork(object):
+    """ SSDP responder and description.xml server for fake devices
+
+    `bridges` -- number of Hue bridges, serials from `serials()`
+    `noise` -- number of non-Hue UPnP devices
+    `latency` -- mean seconds before each device answers, spread +/-50%
+    `loss` -- probability any single reply is lost
+    `spread` -- replies are further delayed by up to this many seconds,
+    like real devices honouring the M-SEARCH MX header
+    `multicast` -- also join the SSDP group on port 1900, so unmodified
+    `ssdp.discover` finds the fleet on this host
+    """
+    def __init__(self, bridges=1, noise=0, host='127.0.0.1', latency=0.0,
+                 loss=0.0, spread=0.0, seed=0, multicast=False):
+        self.host = host
+        self.loss = loss
+        self.spread = spread
+        self.multicast = multicast
+        self.rng = random.Random(seed)
+        self.devices = {}
+        for n in range(bridges):
+            serial = '001788{:06x}'.format(n)
+            self.devices[serial] = FakeDevice(serial, True, self._jitter(latency))
+        for n in range(noise):
+            ident = '0000aa{:06x}'.format(n)
+            self.devices[ident] = FakeDevice(ident, False, self._jitter(latency))
+        self.http_port = None
+        self.ssdp_address = None
+        self.throttle = 0
+        self.retry_after = 1
+        self.portal_requests = 0
+        self.requests = 0
+        self.searches = 0
+        self._loop = None
+        self._thread = None
+        self._error = None
+
+    def _jitter(self, latency):
+        return self.rng.uniform(0.5, 1.5) * latency
+
+    def serials(self):
+        """ Serial numbers of the emulated Hue bridges """
+        return [d.id for d in self.devices.values() if d.hue]
+
+    def urlbase(self, ident):
+        return 'http://{}:{}/{}/'.format(self.host, self.http_port, ident)
+
+    def location(self, ident):
+        return self.urlbase(ident) + 'description.xml'
+
+    @property
+    def portal_url(self):
+        return 'http://{}:{}/api/nupnp'.format(self.host, self.http_port)
+
+    @staticmethod
+    def uuid(device):
+        prefix = '2f402f80-da50-11e1-9b23-' if device.hue else '4d696e69-444c-164e-9d41-'
+        return prefix + device.id
+
+    def portal_json(self):
+        """ N-UPnP portal answer listing every bridge """
+        return json.dumps([
+            {'id': sn[0:6] + 'fffe' + sn[6:], 'internalipaddress': self.urlbase(sn)}
+            for sn in self.serials()])
+
+    def _portal(self, headers):
+        self.portal_requests += 1
+        if self.throttle > 0:
+            self.throttle -= 1
+            return 429, 'text/plain', 'Too Many Requests', {
+                'Retry-After': str(self.retry_after)}
+        body = self.portal_json()
+        etag = '"{:x}"'.format(zlib.crc32(body.encode()))
+        if headers.get('if-none-match') == etag:
+            return 304, 'application/json', '', {'ETag': etag}
+        return 200, 'application/json', body, {'ETag': etag}
+
+    def _respond(self, path, headers=None):
+        if path == '/api/nupnp':
+            return self._portal(headers or {})
+        device = self.devices.get(path.strip('/').split('/')[0])
+        if device is None or not path.endswith('/description.xml'):
+            return 404, 'text/plain', 'Not Found', {}
+        if self.rng.random() < self.loss:
+            return 503, 'text/plain', 'Service Unavailable', {}
+        template = HUE_DESCRIPTION if device.hue else NOISE_DESCRIPTION
+        return 200, 'text/xml', template.format(
+            urlbase=self.urlbase(device.id), host=self.host, id=device.id), {}
+
+    async def _handle_http(self, reader, writer):
+        self.requests += 1
+        try:
+            request = await reader.readline()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            parts = request.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            device = self.devices.get(path.strip('/').split('/')[0])
+            if device is not None and device.latency:
+                await asyncio.sleep(device.latency)
+            status, content_type, body, extra = self._respond(path, headers)
+            body = body.encode()
+            head = ('HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+                    '{}Connection: close\r\n\r\n').format(
+                        status, 'OK' if status == 200 else 'Error',
+                        content_type, len(body),
+                        ''.join('{}: {}\r\n'.format(k, v) for k, v in extra.items()))
+            writer.write(head.encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _ssdp_socket(self):
+        if not self.multicast:
+            return None
+        from discoverhue.ssdp import GROUP
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('', GROUP[1]))
+        membership = struct.pack('4s4s', socket.inet_aton(GROUP[0]),
+                                 socket.inet_aton('0.0.0.0'))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        return sock
+
+    def _run(self, ready):
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        try:
+            server = loop.run_until_complete(asyncio.start_server(
+                self._handle_http, self.host, 0, backlog=1024))
+            self.http_port = server.sockets[0].getsockname()[1]
+            sock = self._ssdp_socket()
+            if sock is None:
+                endpoint = loop.create_datagram_endpoint(
+                    lambda: _SSDPResponder(self), local_addr=(self.host, 0))
+            else:
+                endpoint = loop.create_datagram_endpoint(
+                    lambda: _SSDPResponder(self), sock=sock)
+            transport, _ = loop.run_until_complete(endpoint)
+            self.ssdp_address = transport.get_extra_info('sockname')[0:2]
+        except Exception as error:
+            self._error = error
+            ready.set()
+            return
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            transport.close()
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+    def start(self):
+        """ Start serving on a background thread """
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._error is not None:
+            raise self._error
+        logger.info('Fake network: %d devices, HTTP port %d, SSDP at %s',
+                    len(self.devices), self.http_port, self.ssdp_address)
+        return self
+
+    def stop(self):
+        """ Stop serving and wait for the thread to finish """
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -25,13 +25,18 @@ setup(
         'License :: OSI Approved :: MIT License',
 
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
     ],
 
     keywords='philips hue',
     packages=['discoverhue'],
 
+    python_requires='>=3.7',
     install_requires=['httpfind'],
 
+    entry_points={
+        'console_scripts': ['discoverhue=discoverhue.__main__:main'],
+    },
+
 )
@@ -0,0 +1,26 @@
+""" Smoke test for the discovery benchmarks """
+import json
+import logging
+import unittest
+
+from benchmarks import bench_discovery
+
+class TestBenchDiscovery(unittest.TestCase):
+    """ Run the benchmark on a tiny fleet """
+
+    def test_run(self):
+        """ Expect JSON serialisable results finding every bridge """
+        logging.disable(logging.WARNING)
+        try:
+            report = bench_discovery.run(bridges=3, noise=2, latency=0, window=0.2, runs=2)
+        finally:
+            logging.disable(logging.NOTSET)
+        json.dumps(report)
+        for name in ['find_bridges', 'via_upnp', 'via_nupnp', 'via_mdns']:
+            self.assertEqual(report['results'][name]['found'], 3, msg=name)
+        self.assertEqual(report['results']['via_nupnp']['requests'], 4)
+        self.assertIn('skipped', report['results']['via_scan'])
+        self.assertIn('partial', report['results']['via_mdns'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+""" Test suite for record and replay of discovery traffic """
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from discoverhue import ssdp
+from discoverhue.capture import Recorder, Replayer, load
+from discoverhue.discoverhue import find_bridges, parse_description_xml
+from discoverhue.testing import FakeNetwork
+
+WINDOW = 0.3
+
+class TestCapture(unittest.TestCase):
+    """ Record against the fake network, replay with it stopped """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'site.jsonl')
+        self.net = FakeNetwork(bridges=3, noise=2, latency=0.02, spread=0.1).start()
+        def ssdp_discover(service, timeout=5, **kw):
+            return ssdp.discover(service, timeout=WINDOW,
+                                 group=self.net.ssdp_address, **kw)
+        with patch('discoverhue.discoverhue.ssdp_discover', ssdp_discover), \
+             Recorder(self.path):
+            self.recorded = find_bridges(precheck_timeout=None)
+            parse_description_xml(self.net.location('ffffffffffff'))
+        self.net.stop()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_format(self):
+        """ Expect plain JSON events with every reply and fetch """
+        events = load(self.path)
+        kinds = [e['kind'] for e in events]
+        self.assertEqual(kinds.count('ssdp_search'), 1)
+        self.assertEqual(kinds.count('ssdp_reply'), 5)
+        self.assertEqual(kinds.count('http'), 4)
+        self.assertEqual(events[-1]['error'], 'HTTPError')
+        self.assertEqual(events[-1]['code'], 404)
+
+    def test_replay(self):
+        """ Expect identical results with the network gone """
+        with Replayer(self.path, speed=0):
+            replayed = find_bridges(precheck_timeout=None)
+            self.assertEqual(parse_description_xml(self.net.location('ffffffffffff'))[0], None)
+        self.assertEqual(replayed, self.recorded)
+        self.assertEqual(len(replayed), 3)
+
+    def test_replay_timing(self):
+        """ Expect the recorded SSDP window to be honoured """
+        start = time.monotonic()
+        with Replayer(self.path):
+            find_bridges(precheck_timeout=None)
+        self.assertGreaterEqual(time.monotonic() - start, WINDOW)
+
+    def test_hooks_restored(self):
+        """ Expect the real hooks back after the with-block """
+        from discoverhue import discoverhue as dh
+        before = dh.from_url, dh.ssdp_discover
+        with Replayer(self.path, speed=0):
+            self.assertNotEqual(dh.from_url, before[0])
+        self.assertEqual((dh.from_url, dh.ssdp_discover), before)
+
+if __name__ == '__main__':
+    unittest.main()
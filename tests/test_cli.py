@@ -0,0 +1,143 @@
+""" Test suite for the command line entry point """
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from discoverhue import cache
+from discoverhue.__main__ import main
+
+IMPORT_BUDGET_US = 100000
+HEAVY_MODULES = ['urllib.request', 'xml.etree.ElementTree', 'http.client',
+                 'discoverhue.discoverhue', 'discoverhue.ssdp']
+
+class TestImportTime(unittest.TestCase):
+    """ Measure a cold import of the entry point in a fresh interpreter """
+
+    def test_import_budget(self):
+        """ Expect no heavy modules and a cumulative time within budget """
+        code = ('import sys, discoverhue.__main__; '
+                'print(",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES))
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                cwd=root, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, universal_newlines=True)
+        self.assertEqual(result.stdout.strip(), '')
+        for line in result.stderr.splitlines():
+            if line.rstrip().endswith('| discoverhue.__main__'):
+                cumulative = int(line.split('|')[1])
+                self.assertLess(cumulative, IMPORT_BUDGET_US)
+                break
+        else:
+            self.fail('no import time reported for discoverhue.__main__')
+
+    def test_lazy_attribute(self):
+        """ Expect package attributes to load the discovery module on use """
+        import discoverhue
+        self.assertTrue(callable(discoverhue.find_bridges))
+        with self.assertRaises(AttributeError):
+            discoverhue.no_such_thing
+
+    def test_submodule_attribute(self):
+        """ Expect the discovery module reachable as an attribute in a fresh interpreter """
+        code = 'import discoverhue; print(discoverhue.discoverhue.portal_client)'
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', code], cwd=root,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        self.assertEqual((result.returncode, result.stdout.strip()), (0, 'None'),
+                         msg=result.stderr)
+
+class TestCommands(unittest.TestCase):
+    """ resolve and list against a temporary cache """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'bridges.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_main(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(['--cache', self.path] + list(argv))
+        return code, out.getvalue()
+
+    @patch('discoverhue.discoverhue.find_bridges')
+    def test_resolve_cached(self, find_mock):
+        """ Expect a fresh cache entry answered without discovery """
+        cache.update({'0017884e7dad': 'http://192.168.0.23:80/'}, self.path)
+        code, out = self.run_main('resolve', '0017884e7dad')
+        self.assertEqual((code, out), (0, 'http://192.168.0.23:80/\n'))
+        find_mock.assert_not_called()
+
+    @patch('discoverhue.discoverhue.find_bridges',
+           return_value={'0017884e7dad': 'http://192.168.0.99:80/'})
+    def test_resolve_stale(self, find_mock):
+        """ Expect an old entry validated first and the cache updated """
+        cache.update({'0017884e7dad': 'http://192.168.0.23:80/'}, self.path,
+                     now=time.time() - 3600)
+        code, out = self.run_main('--json', 'resolve', '0017884e7dad')
+        self.assertEqual(code, 0)
+        self.assertEqual(json.loads(out)['urlbase'], 'http://192.168.0.99:80/')
+        self.assertEqual(find_mock.call_args[0][0],
+                         {'0017884e7dad': 'http://192.168.0.23:80/'})
+        self.assertEqual(cache.load(self.path)['0017884e7dad']['urlbase'],
+                         'http://192.168.0.99:80/')
+
+    @patch('discoverhue.discoverhue.find_bridges', return_value={})
+    def test_resolve_missing(self, find_mock):
+        """ Expect a non-zero exit for an unknown bridge """
+        code, out = self.run_main('resolve', 'deadbeef')
+        self.assertEqual(code, 1)
+        self.assertEqual(find_mock.call_args[0][0], ['deadbeef'])
+
+    @patch('discoverhue.discoverhue.find_bridges',
+           return_value={'0017884e7dad': 'http://192.168.0.23:80/'})
+    def test_list(self, find_mock):
+        """ Expect discovery once, then answers from the cache """
+        code, out = self.run_main('--json', 'list')
+        self.assertEqual(json.loads(out), {'0017884e7dad': 'http://192.168.0.23:80/'})
+        code, out = self.run_main('list')
+        self.assertEqual(out, '0017884e7dad http://192.168.0.23:80/\n')
+        self.assertEqual(find_mock.call_count, 1)
+
+    @patch('discoverhue.discoverhue.find_bridges',
+           return_value={'0017884e7dad': 'http://192.168.0.23:80/',
+                         '001788102201': 'http://192.168.0.24:80/'})
+    def test_list_after_resolve(self, find_mock):
+        """ Expect a single cached lookup not to stand in for a listing """
+        cache.update({'0017884e7dad': 'http://192.168.0.23:80/'}, self.path)
+        code, out = self.run_main('resolve', '0017884e7dad')
+        find_mock.assert_not_called()
+        code, out = self.run_main('--json', 'list')
+        self.assertEqual(sorted(json.loads(out)), ['001788102201', '0017884e7dad'])
+        self.assertEqual(find_mock.call_count, 1)
+
+    @patch('discoverhue.scan.sweep',
+           return_value=iter([('0017884e7dad', 'http://10.1.0.23:80/')]))
+    def test_scan(self, sweep_mock):
+        """ Expect swept bridges printed and cached """
+        code, out = self.run_main('scan', '10.1.0.0/16', '--per-target', '8')
+        self.assertEqual((code, out), (0, '0017884e7dad http://10.1.0.23:80/\n'))
+        self.assertEqual(sweep_mock.call_args[0][0], ['10.1.0.0/16'])
+        self.assertEqual(sweep_mock.call_args[1]['per_target'], 8)
+        self.assertIn('0017884e7dad', cache.load(self.path))
+
+    def test_scan_bad_target(self):
+        """ Expect a usage error rather than a traceback """
+        with patch('sys.stderr', new_callable=io.StringIO) as err:
+            with self.assertRaises(SystemExit) as context:
+                self.run_main('scan', '10.1.0.0/16', 'foo')
+        self.assertEqual(context.exception.code, 2)
+        self.assertIn("invalid target 'foo'", err.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
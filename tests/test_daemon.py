@@ -0,0 +1,211 @@
+""" Test suite for the discovery daemon """
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, Mock
+
+from discoverhue.daemon import Daemon, NotReady, query, lookup
+
+FOUND = {
+    '0017884e7dad': 'http://192.168.0.23:80/',
+    '001788102201': 'http://192.168.1.130:80/',
+}
+
+class TestDaemon(unittest.TestCase):
+    """ Serve a mocked discovery result over a temporary socket """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'hue.sock')
+        self.discover = Mock(return_value=FOUND)
+        self.daemon = Daemon(path=self.path, interval=60, discover=self.discover)
+        self.daemon.refresh()
+        self.daemon.start()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def test_query_all(self):
+        """ Expect the whole table """
+        self.assertEqual(query(path=self.path), FOUND)
+
+    def test_query_serial(self):
+        """ Expect a string for a known serial and None otherwise """
+        self.assertEqual(query('0017884e7dad', path=self.path),
+                         'http://192.168.0.23:80/')
+        self.assertIsNone(query('deadbeef', path=self.path))
+
+    def test_lookup_uses_daemon(self):
+        """ Expect no local discovery while the daemon answers """
+        with patch('discoverhue.discoverhue.find_bridges') as find_mock:
+            self.assertEqual(lookup('001788102201', path=self.path),
+                             'http://192.168.1.130:80/')
+        find_mock.assert_not_called()
+
+    def test_empty_refresh(self):
+        """ Expect a failed refresh to keep the prior table """
+        self.discover.return_value = {}
+        self.daemon.refresh()
+        self.assertEqual(query(path=self.path), FOUND)
+
+    def test_second_daemon(self):
+        """ Expect refusal to replace a live daemon """
+        with self.assertRaises(OSError):
+            Daemon(path=self.path, discover=self.discover).start()
+        self.assertTrue(os.path.exists(self.path))
+
+    def test_close_removes_socket(self):
+        """ Expect the socket path to be removed on shutdown """
+        self.daemon.stop()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestNotReady(unittest.TestCase):
+    """ Before the first discovery run completes """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'hue.sock')
+        self.release = threading.Event()
+        self.result = FOUND
+        def discover():
+            self.release.wait(5)
+            return self.result
+        self.daemon = Daemon(path=self.path, interval=60, discover=discover)
+        self.daemon.start()
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.daemon.stop()
+        self.thread.join()
+        self.tmpdir.cleanup()
+
+    def test_not_ready(self):
+        """ Expect NotReady from query and a local fallback from lookup """
+        with self.assertRaises(NotReady):
+            query('0017884e7dad', path=self.path)
+        with patch('discoverhue.discoverhue.find_bridges',
+                   return_value='http://192.168.0.23:80/') as find_mock:
+            self.assertEqual(lookup('0017884e7dad', path=self.path),
+                             'http://192.168.0.23:80/')
+        find_mock.assert_called_once_with('0017884e7dad')
+
+    def test_ready_after_table(self):
+        """ Expect not ready, never an empty table, while it is being filled """
+        answers = []
+        path = self.path
+        class Observed(dict):
+            def items(self):
+                try:
+                    answers.append(query(path=path))
+                except NotReady:
+                    answers.append('not ready')
+                return dict.items(self)
+        self.result = Observed(FOUND)
+        self.release.set()
+        for _ in range(50):
+            if self.daemon.ready:
+                break
+            threading.Event().wait(0.05)
+        self.assertEqual(answers, ['not ready'])
+        self.assertEqual(query(path=self.path), FOUND)
+
+    def test_second_daemon(self):
+        """ Expect a warming up daemon to count as live """
+        with self.assertRaises(OSError):
+            Daemon(path=self.path, discover=dict).start()
+        self.assertTrue(os.path.exists(self.path))
+
+class TestSocketPath(unittest.TestCase):
+    """ Socket location without a runtime directory """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = patch('tempfile.gettempdir', return_value=self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.dict('os.environ')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_private_dir(self):
+        """ Expect the socket in a per-user directory closed to others """
+        from discoverhue.daemon import default_path
+        daemon = Daemon(discover=dict)
+        daemon.start()
+        try:
+            directory = os.path.dirname(default_path())
+            self.assertEqual(os.path.dirname(directory), self.tmpdir.name)
+            self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+        finally:
+            daemon.close()
+
+    @patch('discoverhue.discoverhue.find_bridges', return_value=FOUND)
+    def test_open_dir(self, find_mock):
+        """ Expect a directory others can write to refused by both ends """
+        from discoverhue.daemon import default_path
+        directory = os.path.dirname(default_path())
+        os.mkdir(directory)
+        os.chmod(directory, 0o777)
+        with self.assertRaises(PermissionError):
+            Daemon(discover=dict).start()
+        with self.assertRaises(PermissionError):
+            query()
+        self.assertEqual(lookup(), FOUND)
+
+    def test_foreign_socket(self):
+        """ Expect a stale socket of another user left in place """
+        path = os.path.join(self.tmpdir.name, 'hue.sock')
+        open(path, 'w').close()
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                Daemon(path=path, discover=dict).start()
+        self.assertTrue(os.path.exists(path))
+
+class _Garbled(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.rfile.readline()
+        self.wfile.write(b'garbage\n')
+
+class TestLookupFallback(unittest.TestCase):
+    """ With no daemon listening, discovery runs in-process """
+
+    @patch('discoverhue.discoverhue.find_bridges', return_value=FOUND)
+    def test_fallback_all(self, find_mock):
+        """ Expect the local discovery result """
+        self.assertEqual(lookup(path='/nonexistent/hue.sock'), FOUND)
+        find_mock.assert_called_once_with(None)
+
+    @patch('discoverhue.discoverhue.find_bridges', return_value={})
+    def test_fallback_missing(self, find_mock):
+        """ Expect None rather than the empty dict from find_bridges """
+        self.assertIsNone(lookup('deadbeef', path='/nonexistent/hue.sock'))
+
+    @patch('discoverhue.discoverhue.find_bridges', return_value=FOUND)
+    def test_fallback_garbled(self, find_mock):
+        """ Expect a reply that is not JSON treated as no daemon """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'hue.sock')
+            server = socketserver.UnixStreamServer(path, _Garbled)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                self.assertEqual(lookup(path=path), FOUND)
+            finally:
+                server.shutdown()
+                thread.join()
+                server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@
 import unittest
 from unittest.mock import patch
 import pickle
+import json
 
 from discoverhue.discoverhue import *
 
@@ -98,6 +99,10 @@ def parse_description_xml_mock(location):
         # Missing test case, treat as test module error
         # raise Exception('Missing lookup for test')
 
+def precheck_mock(xmlurls, timeout=None):
+    """ Mock for '_precheck', every host accepts a connection """
+    return set(xmlurls)
+
 url_dispatch = {
     'http://192.168.0.26:49152/0/description.xml':
         'raise urllib.request.URLError("")',    # TODO: change to wrong XML
@@ -216,6 +221,70 @@ class TestParseDescriptionXML(unittest.TestCase):
         self.assertEqual(results, parsed_xml_response[location])
 
 
+#-----------------------------------------------------------------------------
+# Bridge
+#-----------------------------------------------------------------------------
+class TestBridge(unittest.TestCase):
+    """ Unit tests for the Bridge record """
+
+    @patch('discoverhue.discoverhue.from_url', side_effect=from_url_mock)
+    def test_parsed_fields(self, url_mock):
+        """ Expect pre-parsed fields from the provided example """
+        serial, bridge = parse_description_xml('http://192.168.1.130:80/description.xml')
+        self.assertIsInstance(bridge, Bridge)
+        self.assertEqual(bridge.serial, '001788102201')
+        self.assertEqual(bridge.host, '192.168.1.130')
+        self.assertEqual(bridge.hostname, '192.168.1.130')
+        self.assertEqual(bridge.port, 80)
+        self.assertEqual(bridge.model, 'Philips hue bridge 2012')
+        self.assertIsNotNone(bridge.last_seen)
+
+    def test_str_compatible(self):
+        """ Expect the bridge to behave like its URLBase string """
+        bridge = Bridge('http://192.168.0.23:80/', '0017884e7dad')
+        self.assertEqual(bridge, 'http://192.168.0.23:80/')
+        self.assertEqual('http://192.168.0.23:80/', bridge)
+        self.assertEqual(hash(bridge), hash('http://192.168.0.23:80/'))
+        self.assertEqual(str(bridge), 'http://192.168.0.23:80/')
+        self.assertEqual(bridge.lower(), 'http://192.168.0.23:80/')
+        self.assertEqual(bridge + 'api', 'http://192.168.0.23:80/api')
+        self.assertEqual(repr({'sn': bridge}), "{'sn': 'http://192.168.0.23:80/'}")
+        self.assertNotEqual(bridge, 'http://192.168.0.24:80/')
+
+    def test_slots(self):
+        """ Expect no per-instance dictionary """
+        bridge = Bridge('https://192.168.0.23/')
+        self.assertEqual(bridge.port, 443)
+        with self.assertRaises(AttributeError):
+            bridge.__dict__
+        with self.assertRaises(AttributeError):
+            bridge.colour = 'red'
+
+    @patch('discoverhue.discoverhue.from_url', side_effect=from_url_mock)
+    @patch('discoverhue.discoverhue.ssdp_discover', return_value=get_ssdp_scenario('SSDP_1in4.pickle'))
+    def test_source(self, poll_mock, url_mock):
+        """ Expect the discovery method recorded on the bridge """
+        found_bridges = via_upnp()
+        self.assertEqual(found_bridges['0017884e7dad'].source, 'upnp')
+
+    @patch('discoverhue.discoverhue.from_url', side_effect=from_url_mock)
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_round_trip(self, check_mock, url_mock):
+        """ Expect parsed bridges usable as plain strings and as prior input """
+        found = dict([parse_description_xml('http://192.168.1.130:80/description.xml'),
+                      parse_description_xml('http://192.168.0.23:80/description.xml')])
+        self.assertIsInstance(found['001788102201'], str)
+        self.assertEqual(json.loads(json.dumps(found))['001788102201'],
+                         'http://192.168.1.130:80/')
+        self.assertEqual(','.join(sorted(found.values())),
+                         'http://192.168.0.23:80/,http://192.168.1.130:80/')
+        self.assertEqual(pickle.loads(pickle.dumps(found['001788102201'])).serial,
+                         '001788102201')
+        self.assertEqual(find_bridges(dict(found)), found)
+        self.assertEqual(rediscover(found).unchanged, found)
+        self.assertEqual(find_bridges_many(found).found, found)
+
+
 #-----------------------------------------------------------------------------
 # parse_portal_json
 #-----------------------------------------------------------------------------
@@ -323,6 +392,131 @@ class TestParsePortalJSON(unittest.TestCase):
         logging.disable(logging.NOTSET)
 
 
+#-----------------------------------------------------------------------------
+# _precheck
+#-----------------------------------------------------------------------------
+class TestPrecheck(unittest.TestCase):
+    """ Unit tests for the TCP connect pre-check, run against loopback """
+
+    def setUp(self):
+        import socket
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(8)
+        self.open_url = 'http://127.0.0.1:{}/description.xml'.format(
+            self.listener.getsockname()[1])
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        self.closed_url = 'http://127.0.0.1:{}/description.xml'.format(
+            closed.getsockname()[1])
+        closed.close()
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_open_and_closed(self):
+        """ Expect only the listening port to pass """
+        from discoverhue.discoverhue import _precheck
+        reachable = _precheck([self.open_url, self.closed_url], timeout=1)
+        self.assertEqual(reachable, {self.open_url})
+
+    def test_disabled(self):
+        """ Expect every url to pass with no timeout """
+        from discoverhue.discoverhue import _precheck
+        urls = {self.open_url, self.closed_url, 'location'}
+        self.assertEqual(_precheck(urls, timeout=None), urls)
+
+    def test_batched(self):
+        """ Expect more urls than the batch size checked a batch at a time """
+        from discoverhue import discoverhue as dh
+        opened = ['{}{}.xml'.format(self.open_url[:-len('description.xml')], n)
+                  for n in range(5)]
+        with patch('discoverhue.discoverhue.PRECHECK_BATCH', 2), \
+             patch('discoverhue.discoverhue._precheck_batch',
+                   wraps=dh._precheck_batch) as batch_mock:
+            reachable = dh._precheck(opened + [self.closed_url], timeout=1)
+        self.assertEqual(reachable, set(opened))
+        self.assertEqual(batch_mock.call_count, 3)
+        self.assertTrue(all(len(c[0][0]) <= 2 for c in batch_mock.call_args_list))
+
+    def test_out_of_descriptors(self):
+        """ Expect a failing socket() to count as unreachable """
+        from discoverhue.discoverhue import _precheck
+        with patch('socket.socket', side_effect=OSError(24, 'Too many open files')):
+            self.assertEqual(_precheck([self.open_url], timeout=1), set())
+
+    @patch('discoverhue.discoverhue.parse_description_xml')
+    def test_dead_prior_skips_fetch(self, xml_mock):
+        """ Expect no description.xml fetch for a closed port """
+        with patch('discoverhue.discoverhue._discover', return_value={}):
+            find_bridges({'0017884e7dad': self.closed_url})
+        xml_mock.assert_not_called()
+
+
+#-----------------------------------------------------------------------------
+# via_mdns
+#-----------------------------------------------------------------------------
+def mdns_service(address, bridgeid):
+    """ Stand-in for a service assembled by mdns.discover """
+    from discoverhue.mdns import MDNSService
+    service = MDNSService('Philips Hue - {}._hue._tcp.local.'.format(bridgeid[-6:]))
+    service.address, service.port = address, 443
+    service.properties = {'bridgeid': bridgeid}
+    return service
+
+mdns_response = [
+    mdns_service('192.168.0.23', '001788fffe4e7dad'),
+    mdns_service('192.168.2.20', '001788fffe16c18f'),
+]
+
+@patch('discoverhue.discoverhue.parse_description_xml', side_effect=parse_description_xml_mock)
+class TestMDNSdiscovery(unittest.TestCase):
+    """ Unit tests for the mDNS method
+
+    Mocks required for mDNS response and XML request
+    """
+    @patch('discoverhue.discoverhue.mdns_discover', return_value=mdns_response)
+    def test_1in2(self, mdns_mock, xml_mock):
+        """ mDNS returns 2 services with one reachable """
+        found_bridges = via_mdns()
+        self.assertEqual(xml_mock.call_count, 2)
+        self.assertEqual(found_bridges, {'0017884e7dad': 'http://192.168.0.23:80/'})
+        self.assertIsNone(mdns_mock.call_args[1]['until'])
+
+    @patch('discoverhue.discoverhue.mdns_discover', return_value=mdns_response)
+    def test_wanted(self, mdns_mock, xml_mock):
+        """ Expect the wait to end once the wanted bridge id is seen """
+        via_mdns(['0017884e7dad'])
+        until = mdns_mock.call_args[1]['until']
+        self.assertTrue(until(mdns_response[0:1]))
+        self.assertFalse(until(mdns_response[1:2]))
+
+    @patch('discoverhue.discoverhue.mdns_discover', return_value=[])
+    def test_nothing(self, mdns_mock, xml_mock):
+        """ mDNS returns nothing """
+        with self.assertRaises(DiscoveryError):
+            via_mdns()
+        xml_mock.assert_not_called()
+
+    @patch('discoverhue.discoverhue.ssdp_discover')
+    @patch('discoverhue.discoverhue.mdns_discover', return_value=mdns_response)
+    def test_ahead_of_ssdp(self, mdns_mock, poll_mock, xml_mock):
+        """ Expect find_bridges to skip SSDP when mDNS answers """
+        found_bridges = find_bridges('0017884e7dad', mdns=True)
+        self.assertEqual(found_bridges, 'http://192.168.0.23:80/')
+        poll_mock.assert_not_called()
+
+    @patch('discoverhue.discoverhue.via_upnp',
+           return_value={'001788102201': 'http://192.168.0.24:80/'})
+    @patch('discoverhue.discoverhue.mdns_discover', return_value=mdns_response)
+    def test_wanted_not_advertised(self, mdns_mock, upnp_mock, xml_mock):
+        """ Expect SSDP run and merged when mDNS lacks a wanted serial """
+        found_bridges = find_bridges(('0017884e7dad', '001788102201'), mdns=True)
+        self.assertEqual(found_bridges, {'0017884e7dad': 'http://192.168.0.23:80/',
+                                         '001788102201': 'http://192.168.0.24:80/'})
+        self.assertEqual(upnp_mock.call_count, 1)
+
+
 #-----------------------------------------------------------------------------
 # via_upnp
 #-----------------------------------------------------------------------------
@@ -415,6 +609,7 @@ class TestNUPNPdiscovery(unittest.TestCase):
 #-----------------------------------------------------------------------------
 # find_bridges
 #-----------------------------------------------------------------------------
+@patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
 @patch('discoverhue.discoverhue.parse_description_xml', side_effect=parse_description_xml_mock)
 # @patch('discoverhue.discoverhue.ssdp_discover', return_value=get_ssdp_scenario('SSDP_1in4.pickle'))
 @patch('discoverhue.discoverhue.ssdp_discover', return_value=[])
@@ -426,7 +621,7 @@ class TestFindBridges(unittest.TestCase):
     Simulate ssdp failover to portal, yielding 2 bridges reachable with xml
     """
 
-    def test_find_bridges_01(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_01(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with no parameters expect return of dict with two bridges """
         found_bridges = find_bridges()
         # confirm mock calls
@@ -441,20 +636,20 @@ class TestFindBridges(unittest.TestCase):
         self.assertIn('001788102201', found_bridges)
         self.assertEqual(found_bridges['001788102201'], 'http://192.168.1.130:80/')
 
-    def test_find_bridges_02(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_02(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with good serial number expect return of string with ip """
         found_bridges = find_bridges('0017884e7dad')
         self.assertEqual(found_bridges, 'http://192.168.0.23:80/')
         found_bridges = find_bridges('001788102201')
         self.assertEqual(found_bridges, 'http://192.168.1.130:80/')
 
-    def test_find_bridges_03(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_03(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with missing serial expect return of {} """
         found_bridges = find_bridges('deadbeef')
         self.assertEqual(found_bridges, {})
         # TODO: sure?
 
-    def test_find_bridges_04(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_04(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with non-hashable, mutable input expect filtered return """
         known_bridges = ['deadbeef', '0017884e7dad']
         found_bridges = find_bridges(known_bridges)
@@ -464,7 +659,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(known_bridges), 1)
         self.assertIn('deadbeef', known_bridges)
 
-    def test_find_bridges_04a(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_04a(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with non-hashable, mutable input expect filtered return """
         known_bridges = {'deadbeef', '0017884e7dad'}
         found_bridges = find_bridges(known_bridges)
@@ -474,7 +669,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(known_bridges), 1)
         self.assertIn('deadbeef', known_bridges)
 
-    def test_find_bridges_04b(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_04b(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with non-hashable, mutable input expect filtered return """
         known_bridges = ('deadbeef', '0017884e7dad')
         found_bridges = find_bridges(known_bridges)
@@ -486,13 +681,13 @@ class TestFindBridges(unittest.TestCase):
         self.assertIn('0017884e7dad', known_bridges)
 
     @unittest.expectedFailure
-    def test_find_bridges_05(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_05(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with empty dict expect empty dict """
         found_bridges = find_bridges({})
         self.assertEqual(found_bridges, {})
         # TODO: sure?  would None be better?
 
-    def test_find_bridges_05a(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_05a(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with empty non-hashable input expect same as None """
         found_bridges = find_bridges(())
         self.assertEqual(len(found_bridges), 2)
@@ -502,7 +697,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(found_bridges), 2)
         print(found_bridges)
 
-    def test_find_bridges_06(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_06(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with good bridge expect no discovery """
         known_bridges = {'0017884e7dad': 'http://192.168.0.23:80/'}
         found_bridges = find_bridges(known_bridges)
@@ -515,7 +710,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(found_bridges), 1)
         self.assertEqual(len(known_bridges), 0)
 
-    def test_find_bridges_07(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_07(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with two good bridges expect no discovery """
         known_bridges = {
             '0017884e7dad': 'http://192.168.0.23:80/',
@@ -531,7 +726,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(found_bridges), 2)
         self.assertEqual(len(known_bridges), 0)
 
-    def test_find_bridges_08(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_08(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with two good, one bad bridges expect discovery """
         known_bridges = {
             '0017884e7dad': 'http://192.168.0.23:80/',
@@ -549,7 +744,7 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(known_bridges), 1)
         print(known_bridges, found_bridges)
 
-    def test_find_bridges_09(self, json_mock, poll_mock, xml_mock):
+    def test_find_bridges_09(self, json_mock, poll_mock, xml_mock, check_mock):
         """ with bad bridge expect discovery """
         known_bridges = {'0017884e7dad': None}
         found_bridges = find_bridges(known_bridges)
@@ -562,6 +757,197 @@ class TestFindBridges(unittest.TestCase):
         self.assertEqual(len(found_bridges), 1)
         self.assertEqual(len(known_bridges), 0)
 
+
+#-----------------------------------------------------------------------------
+# find_bridges_many
+#-----------------------------------------------------------------------------
+@patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+@patch('discoverhue.discoverhue.parse_description_xml', side_effect=parse_description_xml_mock)
+@patch('discoverhue.discoverhue.ssdp_discover', return_value=[])
+@patch('discoverhue.discoverhue.parse_portal_json', return_value=parsed_portal_response)
+class TestFindBridgesMany(unittest.TestCase):
+    """ Unit tests for find_bridges_many bulk lookup
+
+    Same mocked network as find_bridges
+    """
+
+    def test_many_01(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with serials only expect one discovery and partitioned result """
+        known_bridges = ['deadbeef', '0017884e7dad', '0017884e7dad']
+        result = find_bridges_many(known_bridges)
+        self.assertEqual(json_mock.call_count, 1)
+        self.assertEqual(poll_mock.call_count, 1)
+        self.assertEqual(result.found, {'0017884e7dad': 'http://192.168.0.23:80/'})
+        self.assertEqual(result.missing, {'deadbeef'})
+        self.assertEqual(result.stale, {})
+        self.assertEqual(len(known_bridges), 3)
+
+    def test_many_02(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with shared ips expect each fetched once before discovery """
+        known_bridges = {
+            '0017884e7dad': 'http://192.168.0.23:80/',
+            '001788102201': 'http://192.168.1.130:80/',
+            '00deadbeef00': 'http://192.168.0.23:80/',
+        }
+        result = find_bridges_many(known_bridges)
+        self.assertEqual(xml_mock.call_count, 2 + 5)
+        self.assertEqual(json_mock.call_count, 1)
+        self.assertEqual(len(result.found), 2)
+        self.assertEqual(result.missing, {'00deadbeef00'})
+        self.assertEqual(len(known_bridges), 3)
+
+    def test_many_03(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with a moved bridge expect it reported as stale """
+        known_bridges = {'0017884e7dad': 'http://192.168.2.20/'}
+        result = find_bridges_many(known_bridges)
+        self.assertEqual(result.found, {})
+        self.assertEqual(result.stale, {'0017884e7dad': 'http://192.168.0.23:80/'})
+        self.assertEqual(result.missing, set())
+
+    def test_many_swapped(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with a bridge answering at another serial's ip expect it stale """
+        known_bridges = {
+            '0017884e7dad': 'http://192.168.1.130:80/',
+            '001788102201': 'http://192.168.0.23:80/',
+        }
+        result = find_bridges_many(known_bridges)
+        self.assertEqual(result.found, {})
+        self.assertEqual(result.stale, {'0017884e7dad': 'http://192.168.0.23:80/',
+                                        '001788102201': 'http://192.168.1.130:80/'})
+        self.assertEqual(json_mock.call_count, 0)
+
+    def test_many_04(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with thousands of serials expect a single discovery pass """
+        known_bridges = ['{:012x}'.format(n) for n in range(5000)]
+        known_bridges.append('001788102201')
+        result = find_bridges_many(known_bridges)
+        self.assertEqual(poll_mock.call_count, 1)
+        self.assertEqual(xml_mock.call_count, 5)
+        self.assertEqual(len(result.found), 1)
+        self.assertEqual(len(result.missing), 5000)
+
+
+#-----------------------------------------------------------------------------
+# rediscover
+#-----------------------------------------------------------------------------
+@patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+@patch('discoverhue.discoverhue.parse_description_xml', side_effect=parse_description_xml_mock)
+@patch('discoverhue.discoverhue.ssdp_discover', return_value=[])
+@patch('discoverhue.discoverhue.parse_portal_json', return_value=parsed_portal_response)
+class TestRediscover(unittest.TestCase):
+    """ Unit tests for incremental rediscovery
+
+    Same mocked network as find_bridges
+    """
+    previous = {
+        '0017884e7dad': 'http://192.168.0.23:80/',
+        '001788102201': 'http://192.168.1.130:80/',
+    }
+
+    def test_rediscover_01(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with fresh entries expect no network access """
+        seen = dict.fromkeys(self.previous, 1000.0)
+        diff = rediscover(self.previous, seen, max_age=300, now=1100.0)
+        xml_mock.assert_not_called()
+        poll_mock.assert_not_called()
+        self.assertEqual(diff.unchanged, self.previous)
+        self.assertEqual(diff.table(), self.previous)
+
+    def test_rediscover_02(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with expired, valid entries expect verification only """
+        seen = dict.fromkeys(self.previous, 1000.0)
+        diff = rediscover(self.previous, seen, max_age=300, now=2000.0)
+        self.assertEqual(xml_mock.call_count, 2)
+        poll_mock.assert_not_called()
+        self.assertEqual(diff.unchanged, self.previous)
+        self.assertEqual(diff.seen, dict.fromkeys(self.previous, 2000.0))
+
+    def test_rediscover_03(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with a suspect that moved and one that vanished expect diff """
+        previous = {
+            '0017884e7dad': 'http://192.168.2.20/',
+            '00deadbeef00': 'http://192.168.2.23/',
+            '001788102201': 'http://192.168.1.130:80/',
+        }
+        seen = dict.fromkeys(previous, 1000.0)
+        diff = rediscover(previous, seen, now=1100.0,
+                          suspects=['0017884e7dad', '00deadbeef00'])
+        self.assertEqual(poll_mock.call_count, 1)
+        self.assertEqual(diff.moved, {'0017884e7dad': (
+            'http://192.168.2.20/', 'http://192.168.0.23:80/')})
+        self.assertEqual(diff.removed, {'00deadbeef00': 'http://192.168.2.23/'})
+        self.assertEqual(diff.added, {})
+        self.assertEqual(diff.unchanged, {'001788102201': 'http://192.168.1.130:80/'})
+        self.assertEqual(len(previous), 3)
+
+    def test_rediscover_urlbase_changed(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with a verified bridge reporting a new URLBase expect it moved """
+        previous = {'0017884e7dad': 'http://192.168.0.23/',
+                    '001788102201': 'http://192.168.1.130:80/'}
+        with patch.dict(parsed_xml_response, {'http://192.168.0.23/description.xml':
+                        ('0017884e7dad', 'http://192.168.0.23:8080/')}):
+            diff = rediscover(previous)
+        self.assertEqual(diff.moved, {'0017884e7dad': (
+            'http://192.168.0.23/', 'http://192.168.0.23:8080/')})
+        self.assertEqual(diff.unchanged, {'001788102201': 'http://192.168.1.130:80/'})
+        self.assertEqual(diff.table()['0017884e7dad'], 'http://192.168.0.23:8080/')
+        self.assertEqual(poll_mock.call_count, 0)
+
+    def test_rediscover_04(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with full set expect new bridges reported as added """
+        previous = {'0017884e7dad': 'http://192.168.0.23:80/'}
+        diff = rediscover(previous, full=True)
+        self.assertEqual(diff.added, {'001788102201': 'http://192.168.1.130:80/'})
+        self.assertEqual(diff.unchanged, previous)
+
+
+#-----------------------------------------------------------------------------
+# find_bridges with stats
+#-----------------------------------------------------------------------------
+@patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+@patch('discoverhue.discoverhue.parse_description_xml', side_effect=parse_description_xml_mock)
+@patch('discoverhue.discoverhue.ssdp_discover', return_value=get_ssdp_scenario('SSDP_1in4.pickle'))
+@patch('discoverhue.discoverhue.parse_portal_json', return_value=parsed_portal_response)
+class TestFindBridgesStats(unittest.TestCase):
+    """ Unit tests for per-phase instrumentation of find_bridges """
+
+    def test_stats_01(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with stats expect ssdp phase and packet counters """
+        from discoverhue.stats import Stats
+        scenario = poll_mock.return_value
+        def replay(service, timeout=5, callback=None):
+            # one device answering twice still makes two packets
+            for _ in range(len(scenario) + 1):
+                callback(b'HTTP/1.1 200 OK\r\n\r\n')
+            return scenario
+        poll_mock.side_effect = replay
+        stats = Stats()
+        find_bridges(stats=stats)
+        self.assertEqual(stats.phases['ssdp'][0], 1)
+        self.assertEqual(stats.phases['find_bridges'][0], 1)
+        self.assertNotIn('portal', stats.phases)
+        self.assertEqual(stats.counters['ssdp_packets'], 5)
+        self.assertEqual(stats.counters['ssdp_filtered'], 3)
+
+    def test_stats_02(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with prior ips expect cache hits and misses """
+        from discoverhue.stats import Stats
+        stats = Stats()
+        find_bridges({'0017884e7dad': 'http://192.168.0.23:80/',
+                      '00deadbeef00': 'http://192.168.2.20/'}, stats=stats)
+        self.assertEqual(stats.counters['cache_hits'], 1)
+        self.assertEqual(stats.counters['cache_misses'], 1)
+
+    def test_stats_03(self, json_mock, poll_mock, xml_mock, check_mock):
+        """ with a sink expect stats delivered without passing any """
+        from discoverhue import stats
+        delivered = []
+        with patch.object(stats, 'sink', delivered.append):
+            find_bridges()
+        self.assertEqual(len(delivered), 1)
+        self.assertIn('ssdp', delivered[0].phases)
+        self.assertIsNone(stats.current())
+
 # doctest integration
 # def load_tests(loader, tests, ignore):
 #     import discoverhue
@@ -0,0 +1,109 @@
+""" Test suite for fleet aggregation """
+import threading
+import unittest
+
+from discoverhue.fleet import Agent, Collector
+
+LAB = {
+    '0017884e7dad': 'http://192.168.0.23:80/',
+    '001788102201': 'http://192.168.1.130:80/',
+}
+
+class TestFleet(unittest.TestCase):
+    """ Agents pushing to a collector served on loopback """
+
+    def setUp(self):
+        self.collector = Collector()
+        self.server = self.collector.serve(('127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_initial_push(self):
+        """ Expect the first push to carry every bridge """
+        agent = Agent(self.url, 'lab')
+        self.assertTrue(agent.push(LAB))
+        entry = self.collector.get('0017884e7dad')
+        self.assertEqual(entry.segment, 'lab')
+        self.assertEqual(entry.urlbase, 'http://192.168.0.23:80/')
+
+    def test_delta_only(self):
+        """ Expect only changed and removed bridges in later deltas """
+        agent = Agent(self.url, 'lab')
+        agent.push(LAB)
+        moved = {'0017884e7dad': 'http://192.168.0.99:80/'}
+        self.assertEqual(agent.delta(moved),
+                         (moved, ['001788102201']))
+        self.assertTrue(agent.push(moved))
+        self.assertEqual(self.collector.get('0017884e7dad').urlbase,
+                         'http://192.168.0.99:80/')
+        self.assertIsNone(self.collector.get('001788102201'))
+
+    def test_collector_restart(self):
+        """ Expect a full resend when the collector lost its state """
+        agent = Agent(self.url, 'lab')
+        agent.push(LAB)
+        self.server.collector = self.collector = Collector()
+        self.assertTrue(agent.push(LAB))
+        self.assertEqual(len(self.collector.bridges()), 2)
+
+    def test_segments_merge(self):
+        """ Expect removal from one segment to leave the others alone """
+        Agent(self.url, 'lab').push(LAB)
+        office = Agent(self.url, 'office')
+        office.push({'001788ffffff': 'http://10.0.0.2:80/'})
+        office.push({})
+        self.assertEqual(len(self.collector.bridges()), 2)
+        self.assertIsNone(self.collector.get('001788ffffff'))
+
+    def test_empty_discovery(self):
+        """ Expect a single empty run to keep the segment, repeated ones to clear it """
+        results = [LAB, {}, {}, {}]
+        agent = Agent(self.url, 'lab', discover=lambda: results.pop(0), empty_runs=3)
+        self.assertTrue(agent.run_once())
+        self.assertFalse(agent.run_once())
+        self.assertFalse(agent.run_once())
+        self.assertEqual(len(self.collector.bridges()), 2)
+        self.assertTrue(agent.run_once())
+        self.assertEqual(len(self.collector.bridges()), 0)
+
+    def test_run_survives_errors(self):
+        """ Expect a discovery exception logged and the loop to carry on """
+        stop = threading.Event()
+        calls = []
+        def discover():
+            calls.append(1)
+            if len(calls) == 1:
+                raise OSError('no route')
+            stop.set()
+            return LAB
+        agent = Agent(self.url, 'lab', discover=discover)
+        with self.assertLogs('discoverhue', level='ERROR'):
+            agent.run(interval=0, stop=stop)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(self.collector.bridges()), 2)
+
+    def test_unreachable(self):
+        """ Expect a failed push to be retried on the next call """
+        agent = Agent('http://127.0.0.1:9', 'lab', timeout=1)
+        self.assertFalse(agent.push(LAB))
+        self.assertEqual(agent.delta(LAB), (LAB, []))
+
+    def test_last_seen(self):
+        """ Expect an empty delta to refresh last_seen """
+        collector = Collector()
+        collector.apply({'segment': 'lab', 'seq': 1, 'base': 0,
+                         'upsert': LAB, 'remove': []}, now=1.0)
+        collector.apply({'segment': 'lab', 'seq': 2, 'base': 1,
+                         'upsert': {}, 'remove': []}, now=2.0)
+        self.assertEqual(collector.get('001788102201').last_seen, 2.0)
+        self.assertFalse(collector.apply({'segment': 'lab', 'seq': 9, 'base': 8,
+                                          'upsert': {}, 'remove': []}))
+
+if __name__ == '__main__':
+    unittest.main()
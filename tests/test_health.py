@@ -0,0 +1,114 @@
+""" Test suite for the fleet health monitor """
+import queue
+import random
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from discoverhue.health import Monitor
+
+URLS = {'0017884e7dad': 'http://192.168.0.23/description.xml',
+        '001788102201': 'http://192.168.0.24/description.xml'}
+
+class FakeFleet(object):
+    """ Stand-in for parse_description_xml over a mutable address table """
+    def __init__(self):
+        self.at = {url: sn for sn, url in URLS.items()}
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, location):
+        with self.lock:
+            self.calls.append(location)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        serial = self.at.get(location)
+        return (serial, location) if serial else (None, 'unreachable')
+
+def precheck_mock(xmlurls, timeout=None):
+    return set(xmlurls)
+
+def events(monitor, count, timeout=5):
+    return [monitor.events.get(timeout=timeout) for _ in range(count)]
+
+@patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+class TestMonitor(unittest.TestCase):
+    """ Scheduling and events against a fake fleet """
+
+    def setUp(self):
+        self.fleet = FakeFleet()
+        patcher = patch('discoverhue.discoverhue.parse_description_xml',
+                        side_effect=self.fleet)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def monitor(self, **kw):
+        kw.setdefault('locate', None)
+        return Monitor({sn: url.split('/')[2] for sn, url in URLS.items()},
+                       min_interval=0.05, max_interval=0.4,
+                       rng=random.Random(1), **kw)
+
+    def test_up(self, check_mock):
+        """ Expect an up event for each bridge, then backing off """
+        with self.monitor() as monitor:
+            found = events(monitor, 2)
+            time.sleep(0.5)
+        self.assertEqual({(e.kind, e.serial) for e in found},
+                         {('up', '0017884e7dad'), ('up', '001788102201')})
+        self.assertTrue(monitor.events.empty())
+        # 0.05 doubling to 0.4: a handful of probes each, not ten
+        self.assertLess(len(self.fleet.calls), 14)
+
+    def test_down_and_recover(self, check_mock):
+        """ Expect down after repeated failures and up once it answers """
+        with self.monitor() as monitor:
+            events(monitor, 2)
+            del self.fleet.at[URLS['001788102201']]
+            down = events(monitor, 1)[0]
+            self.assertEqual((down.kind, down.serial), ('down', '001788102201'))
+            self.fleet.at[URLS['001788102201']] = '001788102201'
+            up = events(monitor, 1)[0]
+        self.assertEqual((up.kind, up.serial), ('up', '001788102201'))
+
+    def test_swapped(self, check_mock):
+        """ Expect a move when one known bridge answers at another's address """
+        with self.monitor() as monitor:
+            events(monitor, 2)
+            self.fleet.at = {URLS['0017884e7dad']: '001788102201'}
+            changes = events(monitor, 2)
+        moved = [e for e in changes if e.kind == 'moved']
+        self.assertEqual(moved[0].serial, '001788102201')
+        self.assertEqual(moved[0].location, URLS['0017884e7dad'])
+        self.assertEqual(moved[0].previous, URLS['001788102201'])
+
+    def test_locate(self, check_mock):
+        """ Expect down bridges handed to locate and reported moved """
+        located = queue.Queue()
+        def locate(serials):
+            located.put(serials)
+            return {sn: 'http://192.168.0.99:80/' for sn in serials}
+        with self.monitor(locate=locate) as monitor:
+            events(monitor, 2)
+            self.fleet.at = {URLS['0017884e7dad']: '0017884e7dad',
+                             'http://192.168.0.99:80/description.xml': '001788102201'}
+            kinds = [(e.kind, e.serial) for e in events(monitor, 3)]
+        self.assertEqual(located.get(timeout=1), ['001788102201'])
+        self.assertEqual(kinds, [('down', '001788102201'), ('moved', '001788102201'),
+                                 ('up', '001788102201')])
+        self.assertEqual(monitor.status()['001788102201'],
+                         ('up', 'http://192.168.0.99:80/description.xml'))
+
+    def test_bounded(self, check_mock):
+        """ Expect no more probes in flight than workers """
+        with self.monitor(workers=1) as monitor:
+            events(monitor, 2)
+        self.assertEqual(self.fleet.peak, 1)
+
+if __name__ == '__main__':
+    unittest.main()
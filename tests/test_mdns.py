@@ -0,0 +1,96 @@
+""" Test suite for the minimal mDNS client """
+import socket
+import struct
+import threading
+import unittest
+
+from discoverhue import mdns
+
+SERVICE = '_hue._tcp.local.'
+INSTANCE = 'Philips Hue - 4E7DAD._hue._tcp.local.'
+TARGET = '001788fffe4e7dad.local.'
+
+def _record(name, rtype, rdata):
+    return (mdns._encode_name(name)
+            + struct.pack('!2HIH', rtype, 0x8001, 120, len(rdata)) + rdata)
+
+def bridge_reply():
+    """ Reply as sent by a bridge, PTR answer with SRV, TXT and A extras """
+    txt = b''.join(struct.pack('B', len(e)) + e
+                   for e in [b'bridgeid=001788fffe4e7dad', b'modelid=BSB002'])
+    # SRV target compressed as a pointer back into the A record name
+    a_record = _record(TARGET, mdns.TYPE_A, socket.inet_aton('192.168.0.23'))
+    srv_rdata = struct.pack('!3H', 0, 0, 443) + mdns._encode_name(TARGET)
+    records = [
+        _record(SERVICE, mdns.TYPE_PTR, mdns._encode_name(INSTANCE)),
+        _record(INSTANCE, mdns.TYPE_SRV, srv_rdata),
+        _record(INSTANCE, mdns.TYPE_TXT, txt),
+        a_record,
+    ]
+    header = struct.pack('!6H', 0, 0x8400, 0, 1, 0, 3)
+    return header + b''.join(records)
+
+class TestParse(unittest.TestCase):
+    """ Record parsing without any network """
+
+    def test_query(self):
+        """ Expect a single PTR question """
+        query = mdns.build_query(SERVICE)
+        self.assertEqual(struct.unpack_from('!6H', query), (0, 0, 1, 0, 0, 0))
+        self.assertEqual(query[-4:], struct.pack('!2H', mdns.TYPE_PTR, 1))
+
+    def test_records(self):
+        """ Expect PTR, SRV, TXT and A values decoded """
+        records = mdns.parse_records(bridge_reply())
+        self.assertEqual(records[0], (SERVICE, mdns.TYPE_PTR, INSTANCE))
+        self.assertEqual(records[1][2], (443, TARGET))
+        self.assertEqual(records[2][2]['bridgeid'], '001788fffe4e7dad')
+        self.assertEqual(records[3], (TARGET, mdns.TYPE_A, '192.168.0.23'))
+
+    def test_compressed_name(self):
+        """ Expect a pointer to resolve to the earlier name """
+        data = b'\0' * 12 + mdns._encode_name('a.local.') + b'\x01b\xc0\x0c'
+        self.assertEqual(mdns._decode_name(data, 21), ('b.a.local.', 25))
+
+    def test_pointer_loop(self):
+        """ Expect a self referencing pointer to be rejected """
+        with self.assertRaises(ValueError):
+            mdns._decode_name(b'\xc0\x00', 0)
+
+class TestDiscover(unittest.TestCase):
+    """ Query a loopback responder in place of the multicast group """
+
+    def setUp(self):
+        self.responder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.responder.bind(('127.0.0.1', 0))
+        self.group = self.responder.getsockname()
+        self.thread = threading.Thread(target=self._respond)
+        self.thread.start()
+
+    def _respond(self):
+        query, addr = self.responder.recvfrom(512)
+        self.responder.sendto(b'\xff\xff', addr)       # junk is skipped
+        self.responder.sendto(bridge_reply(), addr)
+
+    def tearDown(self):
+        self.thread.join()
+        self.responder.close()
+
+    def test_discover(self):
+        """ Expect one assembled service """
+        services = mdns.discover(SERVICE, timeout=0.5, group=self.group)
+        self.assertEqual(len(services), 1)
+        self.assertEqual(services[0].address, '192.168.0.23')
+        self.assertEqual(services[0].port, 443)
+
+    def test_until(self):
+        """ Expect an early return once the condition is met """
+        import time
+        start = time.monotonic()
+        services = mdns.discover(SERVICE, timeout=5, group=self.group,
+                                 until=lambda found: bool(found))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(services), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+""" Test suite for the cached portal client """
+import unittest
+from unittest.mock import patch
+
+from discoverhue.discoverhue import parse_portal_json, via_nupnp
+from discoverhue.portal import PortalClient, Throttled, retry_after
+from discoverhue.stats import Stats
+from discoverhue.testing import FakeNetwork
+
+class Clock(object):
+    """ Wall time advanced by hand """
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+class TestPortalClient(unittest.TestCase):
+    """ Caching and backoff against the stand-in portal """
+
+    def setUp(self):
+        self.net = FakeNetwork(bridges=2).start()
+        self.addCleanup(self.net.stop)
+        self.clock = Clock()
+        self.client = PortalClient(self.net.portal_url, ttl=60, backoff=10,
+                                   clock=self.clock)
+
+    def test_ttl(self):
+        """ Expect one portal request while the list is fresh """
+        body = self.client.fetch()
+        self.clock.now += 59
+        self.assertEqual(self.client.fetch(), body)
+        self.assertEqual(self.net.portal_requests, 1)
+
+    def test_not_modified(self):
+        """ Expect an expired list revalidated with its ETag """
+        body = self.client.fetch()
+        self.clock.now += 61
+        with Stats() as stats:
+            self.assertEqual(self.client.fetch(), body)
+        self.assertEqual(self.net.portal_requests, 2)
+        self.assertEqual(stats.counters['portal_not_modified'], 1)
+        self.clock.now += 59
+        self.client.fetch()
+        self.assertEqual(self.net.portal_requests, 2)
+
+    def test_retry_after(self):
+        """ Expect the cached list served until Retry-After has passed """
+        body = self.client.fetch()
+        self.clock.now += 61
+        self.net.throttle, self.net.retry_after = 1, 120
+        self.assertEqual(self.client.fetch(), body)
+        self.clock.now += 100
+        self.assertEqual(self.client.fetch(), body)
+        self.assertEqual(self.net.portal_requests, 2)
+        self.clock.now += 21
+        self.assertEqual(self.client.fetch(), body)
+        self.assertEqual(self.net.portal_requests, 3)
+        self.assertIsNone(self.client.retry_at)
+
+    def test_exponential(self):
+        """ Expect the delay doubled for each consecutive refusal """
+        self.net.throttle, self.net.retry_after = 3, 0
+        delays = []
+        for _ in range(3):
+            with self.assertRaises(Throttled):
+                self.client.fetch()
+            delays.append(self.client.retry_at - self.clock.now)
+            self.clock.now = self.client.retry_at
+        self.assertEqual(delays, [10, 20, 40])
+        self.assertTrue(self.client.fetch())
+
+    def test_throttled_discovery(self):
+        """ Expect a refused portal to end via_nupnp without a request storm """
+        self.net.throttle, self.net.retry_after = 1, 300
+        self.assertEqual(parse_portal_json(self.client), [])
+        self.assertEqual(parse_portal_json(self.client), [])
+        self.assertEqual(self.net.portal_requests, 1)
+
+    def test_installed(self):
+        """ Expect via_nupnp to go through the module's client """
+        client = PortalClient(clock=self.clock)
+        with patch('discoverhue.discoverhue.portal_client', client), \
+             patch('discoverhue.discoverhue.PORTAL_URL', self.net.portal_url):
+            self.assertEqual(sorted(via_nupnp()), sorted(self.net.serials()))
+            via_nupnp()
+        self.assertEqual(self.net.portal_requests, 1)
+
+    def test_retry_after_header(self):
+        """ Expect delta seconds and HTTP dates, None for junk """
+        self.assertEqual(retry_after('120'), 120)
+        self.assertEqual(retry_after('Wed, 21 Oct 2015 07:28:00 GMT',
+                                     now=1445412420.0), 60)
+        self.assertIsNone(retry_after('soon'))
+        self.assertIsNone(retry_after(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+""" Test suite for prioritized scanning """
+import os
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from ipaddress import ip_network
+from unittest.mock import patch
+
+from discoverhue import scan
+from discoverhue.discoverhue import DiscoveryError, find_bridges, via_scan
+
+ARP = """IP address       HW type     Flags       HW address            Mask     Device
+192.168.0.40     0x1         0x2         00:17:88:4e:7d:ad     *        eth0
+192.168.0.41     0x1         0x0         00:00:00:00:00:00     *        eth0
+10.1.2.3         0x1         0x2         00:11:22:33:44:55     *        eth1
+"""
+BRIDGE_URL = 'http://192.168.0.40/description.xml'
+
+def description_mock(location):
+    if location == BRIDGE_URL:
+        return ('0017884e7dad', 'http://192.168.0.40:80/')
+    return (None, None)
+
+def precheck_mock(xmlurls, timeout=None):
+    return set(xmlurls)
+
+class TestPrioritize(unittest.TestCase):
+    """ Probe ordering """
+
+    def test_neighbors(self):
+        """ Expect complete entries only and nothing for a missing table """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'arp')
+            with open(path, 'w') as f:
+                f.write(ARP)
+            self.assertEqual(scan.neighbors(path), ['192.168.0.40', '10.1.2.3'])
+            self.assertEqual(scan.neighbors(os.path.join(tmpdir, 'none')), [])
+
+    def test_order(self):
+        """ Expect seen, then neighbors, then DHCP ranges, routers last """
+        hosts = scan.prioritize('192.168.0.0/24',
+                                seen=['http://192.168.0.23:80/', '8.8.8.8'],
+                                neighbor_hosts=['10.1.2.3', '192.168.0.40', '192.168.0.23'])
+        self.assertEqual(hosts[:4], ['192.168.0.23', '192.168.0.40',
+                                     '192.168.0.100', '192.168.0.101'])
+        self.assertEqual(hosts[-1], '192.168.0.1')
+        self.assertEqual(sorted(hosts), sorted(str(h) for h in ip_network('192.168.0.0/24').hosts()))
+
+class TestProbe(unittest.TestCase):
+    """ Streaming and early exit """
+
+    @patch('discoverhue.discoverhue.parse_description_xml', side_effect=description_mock)
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_stops_when_found(self, check_mock, xml_mock):
+        """ Expect a wanted bridge at a neighbor address to end the sweep """
+        hosts = scan.prioritize('192.168.0.0/24', neighbor_hosts=['192.168.0.40'])
+        found = list(scan.probe(hosts, wanted=['0017884e7dad'], workers=4))
+        self.assertEqual(found, [('0017884e7dad', 'http://192.168.0.40:80/')])
+        self.assertEqual(xml_mock.call_count, 4)
+
+    @patch('discoverhue.discoverhue.from_url',
+           side_effect=lambda url: '<html><body>Router login</html>')
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_not_xml(self, check_mock, url_mock):
+        """ Expect an HTML page on port 80 skipped, not raised """
+        self.assertEqual(list(scan.probe(['192.168.0.1', '192.168.0.2'])), [])
+        self.assertEqual(url_mock.call_count, 2)
+
+    @patch('discoverhue.discoverhue.parse_description_xml', side_effect=description_mock)
+    @patch('discoverhue.discoverhue._precheck', return_value=set())
+    def test_closed_ports(self, check_mock, xml_mock):
+        """ Expect unreachable hosts never to be fetched """
+        self.assertEqual(list(scan.probe(['192.168.0.40', '192.168.0.41'])), [])
+        xml_mock.assert_not_called()
+
+    @patch('discoverhue.discoverhue._local_networks',
+           return_value=[('192.168.0.2', ip_network('192.168.0.0/24'))])
+    @patch('discoverhue.scan.neighbors', return_value=[])
+    @patch('discoverhue.discoverhue.parse_description_xml', side_effect=description_mock)
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_via_scan_wanted(self, check_mock, xml_mock, arp_mock, net_mock):
+        """ Expect the previous address probed first and nothing else after """
+        found = via_scan(['0017884e7dad'], seen=['192.168.0.40'])
+        self.assertEqual(found, {'0017884e7dad': 'http://192.168.0.40:80/'})
+        self.assertEqual(xml_mock.call_args_list[0][0][0], BRIDGE_URL)
+        self.assertLessEqual(xml_mock.call_count, scan.BATCH)
+
+    @patch('discoverhue.discoverhue._local_networks',
+           return_value=[('192.168.0.2', ip_network('192.168.0.0/28'))])
+    @patch('discoverhue.scan.neighbors', return_value=[])
+    @patch('discoverhue.discoverhue.parse_description_xml', return_value=(None, None))
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_via_scan_nothing(self, check_mock, xml_mock, arp_mock, net_mock):
+        """ Expect the whole subnet probed before giving up """
+        with self.assertRaises(DiscoveryError):
+            via_scan(['0017884e7dad'])
+        self.assertEqual(xml_mock.call_count, 14)
+
+class TestFindBridgesNetworks(unittest.TestCase):
+    """ find_bridges with routed networks """
+
+    @patch('discoverhue.discoverhue.via_scan',
+           return_value={'001788102201': 'http://10.1.0.9:80/'})
+    @patch('discoverhue.discoverhue.via_upnp',
+           return_value={'0017884e7dad': 'http://192.168.0.23:80/'})
+    def test_merged(self, upnp_mock, scan_mock):
+        """ Expect the sweep to run after SSDP succeeded and be merged """
+        found = find_bridges(networks=['10.1.0.0/16'])
+        self.assertEqual(sorted(found), ['001788102201', '0017884e7dad'])
+        scan_mock.assert_called_once_with(None, (), ['10.1.0.0/16'])
+
+    @patch('discoverhue.discoverhue.via_scan')
+    @patch('discoverhue.discoverhue.via_upnp',
+           return_value={'0017884e7dad': 'http://192.168.0.23:80/'})
+    def test_wanted_found_locally(self, upnp_mock, scan_mock):
+        """ Expect no sweep once every wanted serial is found """
+        found = find_bridges(['0017884e7dad'], networks=['10.1.0.0/16'])
+        self.assertEqual(list(found), ['0017884e7dad'])
+        scan_mock.assert_not_called()
+
+class TestSweep(unittest.TestCase):
+    """ Several targets sharing the workers """
+
+    def test_parse_target(self):
+        """ Expect CIDRs, both range forms and single addresses """
+        self.assertEqual(scan.parse_target('10.0.0.7/30')[:2],
+                         ('10.0.0.4/30', ip_network('10.0.0.4/30')))
+        self.assertEqual(scan.parse_target('10.0.0.10-12')[2],
+                         ['10.0.0.10', '10.0.0.11', '10.0.0.12'])
+        self.assertEqual(scan.parse_target('10.0.0.255-10.0.1.0')[2],
+                         ['10.0.0.255', '10.0.1.0'])
+        self.assertEqual(scan.parse_target('10.0.0.9')[2], ['10.0.0.9'])
+        for bad in ['10.0.0.12-10', 'bridge', '10.0.0.0/33']:
+            with self.assertRaises(ValueError):
+                scan.parse_target(bad)
+
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_fair_share(self, check_mock):
+        """ Expect a small target finished while a /16 is still queued """
+        active, peak, lock = Counter(), Counter(), threading.Lock()
+        def description(location):
+            subnet = location.split('.')[1]
+            with lock:
+                active[subnet] += 1
+                peak[subnet] = max(peak[subnet], active[subnet])
+            time.sleep(0.001)
+            with lock:
+                active[subnet] -= 1
+            if location == 'http://10.2.0.14/description.xml':
+                return ('001788102201', 'http://10.2.0.14:80/')
+            return (None, None)
+        progress = []
+        with patch('discoverhue.discoverhue.parse_description_xml',
+                   side_effect=description) as xml_mock:
+            found = list(scan.sweep(['10.1.0.0/16', '10.2.0.0/28'],
+                                    wanted=['001788102201'], workers=4,
+                                    per_target=2, progress=progress.append))
+        self.assertEqual(found, [('001788102201', 'http://10.2.0.14:80/')])
+        self.assertLess(xml_mock.call_count, 40)
+        self.assertEqual(peak, Counter({'1': 2, '2': 2}))
+        done = [p for p in progress if p.target == '10.2.0.0/28'][-1]
+        self.assertEqual((done.total, done.found), (14, 1))
+        self.assertEqual(progress[0].total, 65534)
+
+    @patch('discoverhue.scan.neighbors', return_value=[])
+    @patch('discoverhue.discoverhue.parse_description_xml', side_effect=description_mock)
+    @patch('discoverhue.discoverhue._precheck', side_effect=precheck_mock)
+    def test_via_scan_networks(self, check_mock, xml_mock, arp_mock):
+        """ Expect explicit networks swept instead of the local ones """
+        with patch('discoverhue.discoverhue._local_networks') as net_mock:
+            found = via_scan(networks=['192.168.0.32/27', '10.0.0.1-3'])
+        net_mock.assert_not_called()
+        self.assertEqual(found, {'0017884e7dad': 'http://192.168.0.40:80/'})
+        self.assertEqual(xml_mock.call_count, 30 + 3)
+
+if __name__ == '__main__':
+    unittest.main()
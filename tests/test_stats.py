@@ -0,0 +1,42 @@
+""" Test suite for discovery instrumentation """
+import json
+import unittest
+
+from discoverhue import stats
+from discoverhue.stats import Stats
+
+class TestStats(unittest.TestCase):
+    """ Recording through the module level helpers """
+
+    def test_disabled(self):
+        """ Expect the helpers to do nothing with no stats bound """
+        self.assertIsNone(stats.current())
+        with stats.phase('ssdp'):
+            stats.count('ssdp_packets')
+        self.assertIsNone(stats.current())
+
+    def test_bound(self):
+        """ Expect phases and counters recorded while bound """
+        with Stats() as recorded:
+            with stats.phase('ssdp'):
+                stats.count('ssdp_packets', 4)
+            with stats.phase('ssdp'):
+                stats.count('ssdp_packets')
+        calls, total, longest = recorded.phases['ssdp']
+        self.assertEqual(calls, 2)
+        self.assertGreaterEqual(total, longest)
+        self.assertEqual(recorded.counters, {'ssdp_packets': 5})
+        json.dumps(recorded.as_dict())
+
+    def test_nested(self):
+        """ Expect the outer stats restored after an inner binding """
+        with Stats() as outer:
+            with Stats() as inner:
+                stats.count('timeouts')
+            stats.count('cache_hits')
+            self.assertIs(stats.current(), outer)
+        self.assertEqual(inner.counters, {'timeouts': 1})
+        self.assertEqual(outer.counters, {'cache_hits': 1})
+
+if __name__ == '__main__':
+    unittest.main()
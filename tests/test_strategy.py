@@ -0,0 +1,100 @@
+""" Test suite for adaptive discovery method ordering """
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from discoverhue.discoverhue import DiscoveryError, find_bridges
+from discoverhue import strategy as strategy_module
+from discoverhue.strategy import Strategy
+
+METHODS = ['upnp', 'nupnp', 'scan']
+FOUND = {'0017884e7dad': 'http://192.168.0.23:80/'}
+ROUTE = """Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask
+eth0\t0000A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF
+eth0\t00000000\t0100A8C0\t0003\t0\t0\t0\t00000000
+"""
+
+class TestStrategy(unittest.TestCase):
+    """ Ordering and persistence of per-network stats """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'strategy.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def strategy(self, **kw):
+        kw.setdefault('explore', 0)
+        return Strategy(self.path, network='192.168.0.0/24', **kw)
+
+    def test_default_order(self):
+        """ Expect the fixed order with no history """
+        self.assertEqual(self.strategy().order(METHODS), METHODS)
+
+    def test_failed_method_last(self):
+        """ Expect a method that never worked behind untried ones """
+        strategy = self.strategy()
+        strategy.record('upnp', False, 5.0)
+        self.assertEqual(strategy.order(METHODS), ['nupnp', 'scan', 'upnp'])
+
+    def test_fastest_first(self):
+        """ Expect the fastest successful method first """
+        strategy = self.strategy()
+        strategy.record('upnp', True, 5.0)
+        strategy.record('nupnp', True, 0.3)
+        self.assertEqual(strategy.order(METHODS), ['nupnp', 'upnp', 'scan'])
+
+    def test_explore(self):
+        """ Expect another method moved to the front when exploring """
+        strategy = self.strategy(explore=1)
+        strategy.record('nupnp', True, 0.3)
+        self.assertNotEqual(strategy.order(METHODS)[0], 'nupnp')
+
+    def test_persisted_per_network(self):
+        """ Expect stats saved and kept apart by network """
+        strategy = self.strategy()
+        strategy.record('nupnp', True, 0.3)
+        strategy.save()
+        self.assertEqual(self.strategy().stats('nupnp')['successes'], 1)
+        other = Strategy(self.path, network='10.0.0.0/24', explore=0)
+        self.assertEqual(other.stats('nupnp'), {})
+
+    @patch('discoverhue.discoverhue.via_scan')
+    @patch('discoverhue.discoverhue.via_nupnp', return_value=FOUND)
+    @patch('discoverhue.discoverhue.via_upnp', side_effect=DiscoveryError)
+    def test_find_bridges_learns(self, upnp_mock, nupnp_mock, scan_mock):
+        """ Expect broken SSDP to be skipped once the portal has worked """
+        strategy = self.strategy()
+        self.assertEqual(find_bridges(strategy=strategy), FOUND)
+        self.assertEqual(upnp_mock.call_count, 1)
+        self.assertEqual(find_bridges(strategy=strategy), FOUND)
+        self.assertEqual(upnp_mock.call_count, 1)
+        self.assertEqual(nupnp_mock.call_count, 2)
+        scan_mock.assert_not_called()
+        self.assertTrue(os.path.exists(self.path))
+
+class TestNetworkKey(unittest.TestCase):
+    """ Identifying the current network """
+
+    def test_outbound_and_gateway(self):
+        """ Expect the outbound /24 and the default gateway """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'route')
+            with open(path, 'w') as f:
+                f.write(ROUTE)
+            self.assertEqual(strategy_module._gateway(path), '192.168.0.1')
+            self.assertIsNone(strategy_module._gateway(os.path.join(tmpdir, 'none')))
+        with patch('discoverhue.strategy._outbound_address', return_value='192.168.0.23'), \
+             patch('discoverhue.strategy._gateway', return_value='192.168.0.1'):
+            self.assertEqual(strategy_module.network_key(), '192.168.0.0/24,via 192.168.0.1')
+
+    @patch('discoverhue.strategy._outbound_address', return_value=None)
+    def test_loopback_only(self, outbound_mock):
+        """ Expect loopback ignored, leaving 'unknown' """
+        with patch('socket.gethostbyname_ex', return_value=('h', [], ['127.0.1.1'])):
+            self.assertEqual(strategy_module.network_key(), 'unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+""" Test suite for the fake bridge network """
+import unittest
+from functools import partial
+from unittest.mock import patch
+
+from discoverhue import ssdp
+from discoverhue.discoverhue import parse_description_xml, via_upnp, via_nupnp
+from discoverhue.testing import FakeNetwork
+
+class TestFakeNetwork(unittest.TestCase):
+    """ Real discovery code against the simulated network """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.net = FakeNetwork(bridges=5, noise=3).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.net.stop()
+
+    def test_ssdp(self):
+        """ Expect one reply per device, five of them bridges """
+        found = ssdp.discover('ssdp:all', timeout=0.5, group=self.net.ssdp_address)
+        self.assertEqual(len(found), 8)
+        self.assertEqual(len([u for u in found if 'IpBridge' in u.server]), 5)
+
+    def test_description(self):
+        """ Expect bridges to parse and noise devices to be rejected """
+        serial = self.net.serials()[0]
+        self.assertEqual(parse_description_xml(self.net.location(serial)),
+                         (serial, self.net.urlbase(serial)))
+        self.assertEqual(parse_description_xml(self.net.location('0000aa000000')),
+                         (None, None))
+
+    def test_via_upnp(self):
+        """ Expect every bridge from an unmodified via_upnp """
+        discover = partial(ssdp.discover, group=self.net.ssdp_address)
+        with patch('discoverhue.discoverhue.ssdp_discover',
+                   lambda *args, **kw: discover(*args, **dict(kw, timeout=0.5))):
+            found = via_upnp()
+        self.assertEqual(sorted(found), sorted(self.net.serials()))
+
+    def test_via_nupnp(self):
+        """ Expect every bridge from the stand-in portal """
+        with patch('discoverhue.discoverhue.PORTAL_URL', self.net.portal_url):
+            found = via_nupnp()
+        self.assertEqual(sorted(found), sorted(self.net.serials()))
+
+class TestFakeNetworkScale(unittest.TestCase):
+    """ A larger fleet with lossy replies """
+
+    def test_loss(self):
+        """ Expect some replies lost but never more than were sent """
+        with FakeNetwork(bridges=200, noise=50, loss=0.2, spread=0.05) as net:
+            found = ssdp.discover('ssdp:all', timeout=0.5, group=net.ssdp_address)
+        self.assertEqual(net.searches, 1)
+        self.assertLess(len(found), 250)
+        self.assertGreater(len(found), 100)
+
+if __name__ == '__main__':
+    unittest.main()